@@ -1,20 +1,38 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 import json
-from pydantic import BaseModel
+import os
+from pydantic import BaseModel, TypeAdapter, ValidationError
 import asyncio
 
-from database import get_db, engine
+from database import get_db, get_async_db, engine, async_engine, SessionLocal
 import models
 from crowd_simulation import CrowdSimulator
 from bus_routing_system import BusRoutingSystem
 from map_integration import MapIntegration
+from network_index import NetworkIndex
+from density_ingest import IngestStats, ingest_densities
+from density_updater import DensityUpdater
+import crowd_history
+import route_stops
+from density_forecast import DensityForecaster
+from journey_planner import JourneyPlanner
+from response_cache import ResponseCache
+from driver_assignment import assign_off_duty_drivers
+from density_stream import DensityHub
 
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
+crowd_history.ensure_schema(engine)
+route_stops.ensure_schema(engine)
 
 app = FastAPI(title="Bus Routing System API")
 
@@ -31,6 +49,29 @@ app.add_middleware(
 crowd_simulator = CrowdSimulator()
 bus_routing_system = BusRoutingSystem()
 map_integration = MapIntegration()
+network_index = NetworkIndex()
+ingest_stats = IngestStats()
+density_forecaster = DensityForecaster(crowd_simulator)
+journey_planner = JourneyPlanner(network_index)
+# Read responses are cached per network_index.version, which every write to stops, routes or densities bumps
+# (/routes per topology_version, which density writes leave alone)
+response_cache = ResponseCache()
+# Pushes coalesced density changes to /density/stream and /density/ws clients
+density_hub = DensityHub()
+
+def on_densities_updated(densities: dict):
+    """Propagate committed density changes to the in-memory consumers"""
+    network_index.update_densities(densities)
+    density_forecaster.observe(densities)
+    density_hub.publish(densities)
+
+density_updater = DensityUpdater(
+    crowd_simulator,
+    SessionLocal,
+    interval=float(os.getenv("DENSITY_UPDATE_INTERVAL", "300")),  # seconds
+    on_update=on_densities_updated
+)
+background_tasks: List[asyncio.Task] = []
 
 # Pydantic models for request/response
 class BusStopBase(BaseModel):
@@ -72,6 +113,8 @@ class Route(RouteBase):
 class RouteRequest(BaseModel):
     from_stop: int
     to_stop: int
+    use_forecast: bool = False  # score by expected crowding at arrival instead of current density
+    max_transfers: int = 2  # transfers allowed when no single route serves both stops
 
     class Config:
         from_attributes = True  # New Pydantic V2 syntax for orm_mode
@@ -116,174 +159,373 @@ class DensityUpdate(BaseModel):
     stop_id: int
     new_density: float
 
-# Background task for crowd simulation
-async def update_crowd_density(db: Session):
-    while True:
-        try:
-            stops = db.query(models.BusStop).all()
-            for stop in stops:
-                new_density = crowd_simulator.get_current_density(
-                    stop.id
-                )
-                stop.current_density = new_density
-                db.commit()
-        except Exception as e:
-            print(f"Error updating crowd density: {e}")
-        await asyncio.sleep(300)  # Update every 5 minutes
+density_update_list = TypeAdapter(List[DensityUpdate])
+bus_stop_list = TypeAdapter(List[BusStop])
+route_list = TypeAdapter(List[Route])
+
+def parse_density_updates(body: bytes, content_type: str) -> List[DensityUpdate]:
+    """Parse a JSON array of density updates, or one update per line for NDJSON bodies"""
+    if "ndjson" in content_type:
+        return [DensityUpdate.model_validate_json(line) for line in body.splitlines() if line.strip()]
+    return density_update_list.validate_json(body)
 
 @app.on_event("startup")
 async def startup_event():
+    # Load stops and routes into the in-memory index used by /route
+    db = SessionLocal()
+    try:
+        network_index.rebuild(db)
+        density_forecaster.warm_start(db)
+    finally:
+        db.close()
+    density_hub.reset({stop_id: stop["density"] for stop_id, stop in network_index.stops.items()})
+    density_hub.start()
+
     # Start crowd simulation background task
-    asyncio.create_task(update_crowd_density(next(get_db())))
+    density_updater.start()
+    # Apply the crowd history retention policy every hour
+    background_tasks.append(asyncio.create_task(crowd_history.run_compaction(SessionLocal)))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await density_updater.stop()
+    await density_hub.stop()
+    for task in background_tasks:
+        task.cancel()
+    background_tasks.clear()
+    # Pooled aiosqlite connections each keep a worker thread alive until closed
+    await async_engine.dispose()
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to Bus Routing System API"}
 
 @app.get("/stops", response_model=List[BusStop])
-def get_stops(db: Session = Depends(get_db)):
-    return db.query(models.BusStop).all()
+async def get_stops(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        stops = (await db.execute(select(models.BusStop))).scalars().all()
+        return bus_stop_list.dump_json(bus_stop_list.validate_python(stops, from_attributes=True))
+    return await response_cache.respond_async(request, "stops", network_index.version, build)
 
 @app.post("/stops", response_model=BusStop)
-def create_stop(stop: BusStopCreate, db: Session = Depends(get_db)):
+async def create_stop(stop: BusStopCreate, db: AsyncSession = Depends(get_async_db)):
     db_stop = models.BusStop(**stop.dict())
     db.add(db_stop)
-    db.commit()
-    db.refresh(db_stop)
+    await db.commit()
+    await db.refresh(db_stop)
+    network_index.upsert_stop(db_stop)
+    density_hub.publish({db_stop.id: db_stop.current_density})
     return db_stop
 
 @app.get("/routes", response_model=List[Route])
-def get_routes(db: Session = Depends(get_db)):
-    return db.query(models.Route).all()
+async def get_routes(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        routes = (await db.execute(select(models.Route))).scalars().all()
+        return route_list.dump_json(route_list.validate_python(routes, from_attributes=True))
+    # The route list carries no densities, so only stop and route writes make it stale
+    return await response_cache.respond_async(request, "routes", network_index.topology_version, build)
 
 @app.post("/routes", response_model=Route)
-def create_route(route: RouteCreate, db: Session = Depends(get_db)):
+async def create_route(route: RouteCreate, db: AsyncSession = Depends(get_async_db)):
     db_route = models.Route(**route.dict())
     db.add(db_route)
-    db.commit()
-    db.refresh(db_route)
+    await db.flush()
+    await db.run_sync(route_stops.sync_route, db_route)
+    await db.commit()
+    await db.refresh(db_route)
+    network_index.upsert_route(db_route)
     return db_route
 
 @app.get("/drivers", response_model=List[Driver])
-def get_drivers(db: Session = Depends(get_db)):
-    return db.query(models.Driver).all()
+async def get_drivers(db: AsyncSession = Depends(get_async_db)):
+    return (await db.execute(select(models.Driver))).scalars().all()
 
 @app.post("/drivers", response_model=Driver)
-def create_driver(driver: DriverCreate, db: Session = Depends(get_db)):
+async def create_driver(driver: DriverCreate, db: AsyncSession = Depends(get_async_db)):
     db_driver = models.Driver(**driver.dict())
     db.add(db_driver)
-    db.commit()
-    db.refresh(db_driver)
+    await db.commit()
+    await db.refresh(db_driver)
     return db_driver
 
-@app.post("/route")
-async def find_route(route_request: RouteRequest, db: Session = Depends(get_db)):
-    try:
-        # Get all active routes
-        all_routes = db.query(models.Route).filter(models.Route.is_active == True).all()
-        
-        # Get the stops
-        from_stop_obj = db.query(models.BusStop).filter(models.BusStop.id == route_request.from_stop).first()
-        to_stop_obj = db.query(models.BusStop).filter(models.BusStop.id == route_request.to_stop).first()
-        
-        if not from_stop_obj or not to_stop_obj:
-            raise HTTPException(status_code=404, detail="Stop not found")
-        
-        # Find all possible routes between the stops
-        possible_routes = []
-        for route in all_routes:
-            route_stops = route.stops
-            if route_request.from_stop in route_stops and route_request.to_stop in route_stops:
-                # Calculate route metrics
-                from_idx = route_stops.index(route_request.from_stop)
-                to_idx = route_stops.index(route_request.to_stop)
-                
-                # Get the stops in the correct order
-                if from_idx < to_idx:
-                    route_stops = route_stops[from_idx:to_idx + 1]
-                else:
-                    route_stops = route_stops[to_idx:from_idx + 1]
-                    route_stops.reverse()
-                
-                # Calculate total crowd density and demand along the route
-                total_density = 0
-                total_demand = 0
-                stop_details = []
-                
-                for stop_id in route_stops:
-                    stop = db.query(models.BusStop).filter(models.BusStop.id == stop_id).first()
-                    total_density += stop.current_density
-                    total_demand += stop.base_demand
-                    stop_details.append({
-                        "id": stop.id,
-                        "name": stop.name,
-                        "density": stop.current_density,
-                        "demand": stop.base_demand
-                    })
-                
-                # Calculate route score based on both density and demand
-                avg_density = total_density / len(route_stops)
-                avg_demand = total_demand / len(route_stops)
-                
-                # Lower score is better - prioritize routes with high demand but manageable density
-                route_score = avg_density / (avg_demand + 1)  # Add 1 to avoid division by zero
-                
-                possible_routes.append({
-                    "route_id": route.id,
-                    "name": route.name,
-                    "stops": route_stops,
-                    "stop_details": stop_details,
-                    "total_distance": route.total_distance,
-                    "estimated_time": route.estimated_time,
-                    "avg_density": avg_density,
-                    "avg_demand": avg_demand,
-                    "route_score": route_score
-                })
-        
-        if not possible_routes:
-            raise HTTPException(status_code=404, detail="No route found between the specified stops")
-        
-        # Sort routes by score (lower is better) and return the best one
-        best_route = min(possible_routes, key=lambda x: x["route_score"])
-        
+def forecast_density_at():
+    """(stop_id, minutes from now) -> forecast density, for scoring by expected crowding at arrival"""
+    now = datetime.now()
+    return lambda stop_id, minutes: density_forecaster.expected_density(
+        stop_id, now + timedelta(minutes=minutes)
+    )
+
+def route_result(from_stop: dict, to_stop: dict, best_route: dict = None, best_journey: dict = None) -> dict:
+    """
+    Body of a /route answer. Direct routes fill "route" as they always have; when only a
+    journey with transfers connects the stops, "route" is None and "journey" holds it,
+    with the summary fields taken from the journey
+    """
+    if best_route is not None:
         return {
             "route": best_route,
-            "from_stop": from_stop_obj.name,
-            "to_stop": to_stop_obj.name,
+            "journey": None,
+            "from_stop": from_stop["name"],
+            "to_stop": to_stop["name"],
+            "transfers": 0,
             "total_stops": len(best_route["stops"]),
             "estimated_time": best_route["estimated_time"],
             "crowd_score": best_route["avg_density"],
             "demand_score": best_route["avg_demand"],
             "route_score": best_route["route_score"]
         }
+    return {
+        "route": None,
+        "journey": best_journey,
+        "from_stop": from_stop["name"],
+        "to_stop": to_stop["name"],
+        "transfers": best_journey["transfers"],
+        "total_stops": best_journey["total_stops"],
+        "estimated_time": best_journey["total_minutes"],
+        "crowd_score": best_journey["avg_density"],
+        "demand_score": None,
+        "route_score": None
+    }
+
+def resolve_route(route_request: RouteRequest) -> dict:
+    """Body of the /route response; raises HTTPException when there is no answer"""
+    # Get the stops
+    from_stop_obj = network_index.get_stop(route_request.from_stop)
+    to_stop_obj = network_index.get_stop(route_request.to_stop)
+    
+    if not from_stop_obj or not to_stop_obj:
+        raise HTTPException(status_code=404, detail="Stop not found")
+    
+    # Optionally score by the forecast density at each stop's arrival time
+    density_at = forecast_density_at() if route_request.use_forecast else None
+
+    # Find the best of all possible routes between the stops (lower score is better)
+    best_route = network_index.best_route(
+        route_request.from_stop, route_request.to_stop, density_at
+    )
+    
+    if best_route is None:
+        # Fall back to journeys that change routes at shared stops
+        journeys = journey_planner.plan(
+            route_request.from_stop, route_request.to_stop, route_request.max_transfers
+        )
+        if not journeys:
+            raise HTTPException(status_code=404, detail="No route found between the specified stops")
+        return route_result(from_stop_obj, to_stop_obj, best_journey=journeys[0])
+    
+    return route_result(from_stop_obj, to_stop_obj, best_route)
+
+@app.post("/route")
+def find_route(route_request: RouteRequest, request: Request):
+    # Plain def: the journey planner fallback is CPU-bound and takes the planner lock, so it runs in the threadpool
+    try:
+        # Forecast scores also move with the clock, so only current-density answers are cached
+        if route_request.use_forecast:
+            return resolve_route(route_request)
+        key = ("route", route_request.from_stop, route_request.to_stop, route_request.max_transfers)
+        return response_cache.respond(request, key, network_index.version, lambda: json.dumps(
+            resolve_route(route_request), default=jsonable_encoder
+        ).encode())
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def stream_route_results(index: NetworkIndex, route_requests: List[RouteRequest], density_at):
+    """
+    Answer a batch of route requests against one index snapshot and one frozen
+    forecast (density_at), as NDJSON lines
+    Requests are grouped by origin so that all transfer journeys from an origin come
+    from a single planner search. Lines follow origin order and carry the position
+    of their request in the batch.
+    """
+    by_origin = {}
+    for position, route_request in enumerate(route_requests):
+        by_origin.setdefault(route_request.from_stop, []).append(position)
+
+    for from_stop, positions in by_origin.items():
+        from_stop_obj = index.get_stop(from_stop)
+        results = {}
+        without_route = []
+        for position in positions:
+            route_request = route_requests[position]
+            to_stop_obj = index.get_stop(route_request.to_stop)
+            if not from_stop_obj or not to_stop_obj:
+                results[position] = {"status": 404, "detail": "Stop not found"}
+                continue
+            try:
+                best_route = index.best_route(
+                    from_stop, route_request.to_stop, density_at if route_request.use_forecast else None
+                )
+            except Exception as e:
+                results[position] = {"status": 400, "detail": str(e)}
+                continue
+            if best_route is None:
+                without_route.append(position)
+            else:
+                results[position] = {"status": 200, "result": route_result(from_stop_obj, to_stop_obj, best_route)}
+
+        if without_route:
+            plans = journey_planner.plan_many(
+                from_stop,
+                [route_requests[position].to_stop for position in without_route],
+                max(route_requests[position].max_transfers for position in without_route),
+                index
+            )
+            for position in without_route:
+                route_request = route_requests[position]
+                journeys = [journey for journey in plans[route_request.to_stop]
+                            if journey["transfers"] <= route_request.max_transfers]
+                if journeys:
+                    to_stop_obj = index.get_stop(route_request.to_stop)
+                    results[position] = {"status": 200,
+                                         "result": route_result(from_stop_obj, to_stop_obj,
+                                                                best_journey=journeys[0])}
+                else:
+                    results[position] = {"status": 404, "detail": "No route found between the specified stops"}
+
+        yield "".join(json.dumps({"index": position, **results[position]}, default=jsonable_encoder) + "\n"
+                      for position in positions)
+
+@app.post("/route/batch")
+async def find_routes(route_requests: List[RouteRequest]):
+    """
+    Evaluate many route requests against one consistent snapshot of stops and routes
+    Streams one NDJSON line per request: {"index", "status", "result"} or {"index", "status", "detail"}
+    """
+    snapshot = network_index.snapshot()
+    density_at = density_forecaster.density_lookup() if any(r.use_forecast for r in route_requests) else None
+    return StreamingResponse(stream_route_results(snapshot, route_requests, density_at),
+                             media_type="application/x-ndjson")
+
+@app.post("/journey")
+async def plan_journey(route_request: RouteRequest):
+    """Best journeys with up to max_transfers transfers, one per transfer count, best first"""
+    from_stop_obj = network_index.get_stop(route_request.from_stop)
+    to_stop_obj = network_index.get_stop(route_request.to_stop)
+    if not from_stop_obj or not to_stop_obj:
+        raise HTTPException(status_code=404, detail="Stop not found")
+    if route_request.max_transfers < 0:
+        raise HTTPException(status_code=422, detail="max_transfers must be non-negative")
+
+    journeys = await run_in_threadpool(
+        journey_planner.plan, route_request.from_stop, route_request.to_stop, route_request.max_transfers
+    )
+    if not journeys:
+        raise HTTPException(status_code=404, detail="No journey found between the specified stops")
+    return {
+        "from_stop": from_stop_obj["name"],
+        "to_stop": to_stop_obj["name"],
+        "journeys": journeys
+    }
+
 @app.post("/update-density")
-def update_density(update: DensityUpdate, db: Session = Depends(get_db)):
-    stop = db.query(models.BusStop).filter(models.BusStop.id == update.stop_id).first()
+async def update_density(update: DensityUpdate, db: AsyncSession = Depends(get_async_db)):
+    stop = await db.get(models.BusStop, update.stop_id)
     if not stop:
         raise HTTPException(status_code=404, detail="Stop not found")
     stop.current_density = update.new_density
-    db.commit()
+    readings = [(stop.id, update.new_density, datetime.utcnow())]
+    await db.run_sync(lambda session: crowd_history.record_densities(session, readings))
+    await db.commit()
+    on_densities_updated({stop.id: update.new_density})
     return {"message": "Density updated successfully"}
 
+@app.post("/update-density/bulk")
+async def bulk_update_density(request: Request, db: Session = Depends(get_db)):
+    """
+    Apply many density readings in one transaction
+    Accepts a JSON array of DensityUpdate objects, or NDJSON
+    (Content-Type: application/x-ndjson) with one object per line
+    """
+    try:
+        updates = parse_density_updates(await request.body(), request.headers.get("content-type", ""))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_input=False))
+
+    readings = [(update.stop_id, update.new_density) for update in updates]
+    updated, unknown, elapsed = await run_in_threadpool(ingest_densities, db, readings, ingest_stats)
+    on_densities_updated(updated)
+    return {
+        "received": len(readings),
+        "updated_stops": len(updated),
+        "unknown_stop_ids": unknown,
+        "elapsed_ms": elapsed * 1000,
+        "stats": ingest_stats.snapshot()
+    }
+
+@app.get("/update-density/stats")
+def get_density_ingest_stats():
+    return ingest_stats.snapshot()
+
+@app.get("/stops/{stop_id}/history")
+def get_stop_history(stop_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                     resolution: int = 900, db: Session = Depends(get_db)):
+    """
+    Density history of a stop, in buckets of resolution seconds (default: last 24 hours)
+    Served from the coarsest rollup that satisfies the requested resolution and still
+    covers start; older ranges come back at the resolution of the tier that does
+    """
+    if resolution <= 0:
+        raise HTTPException(status_code=422, detail="resolution must be positive")
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=1)
+    return crowd_history.query_history(db, stop_id, start, end, resolution)
+
+@app.get("/stops/{stop_id}/routes")
+async def get_stop_routes(stop_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Active routes serving a stop and the position of the stop along each, from the route_stops index"""
+    if network_index.get_stop(stop_id) is None:
+        raise HTTPException(status_code=404, detail="Stop not found")
+    visits = await db.run_sync(route_stops.routes_serving, stop_id)
+    return [{"route_id": route_id, "seq": seq} for route_id, seq in visits]
+
+@app.get("/density/stream")
+async def stream_densities():
+    """
+    Server-Sent Events of crowd density: a "snapshot" event with every stop, then one
+    "delta" event per batch of changes ({"type", "seq", "densities": {stop_id: density}})
+    """
+    return StreamingResponse(density_hub.sse_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/density/ws")
+async def density_websocket(websocket: WebSocket):
+    """The /density/stream messages over a WebSocket, one JSON text frame each"""
+    await websocket.accept()
+    await density_hub.serve_websocket(websocket)
+
+@app.get("/density/stream/stats")
+def get_density_stream_stats():
+    return density_hub.stats()
+
+@app.get("/forecast")
+def get_forecast(hours: int = 6):
+    """Predicted density of every stop for the next `hours` hours, starting with the current hour"""
+    if not 1 <= hours <= 168:
+        raise HTTPException(status_code=422, detail="hours must be between 1 and 168")
+    stop_ids, densities = density_forecaster.forecast(hours)
+    return {
+        "start": datetime.now().replace(minute=0, second=0, microsecond=0),
+        "hours": hours,
+        "stops": {int(stop_id): row.tolist() for stop_id, row in zip(stop_ids, densities)}
+    }
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    return response_cache.stats()
+
+@app.get("/density-updater/status")
+def get_density_updater_status():
+    return density_updater.status()
+
 @app.post("/assign-drivers")
 def assign_drivers(db: Session = Depends(get_db)):
+    """
+    Give every active route the off-duty driver that minimizes the total assignment cost
+    (hours worked, distance from the end of their last route, upcoming breaks)
+    All assignments are written in one transaction
+    """
     try:
-        # Get all active routes and available drivers
-        routes = db.query(models.Route).filter(models.Route.is_active == True).all()
-        drivers = db.query(models.Driver).filter(models.Driver.status == "off_duty").all()
-        
-        # Simple assignment logic (can be enhanced with more sophisticated algorithms)
-        for i, route in enumerate(routes):
-            if i < len(drivers):
-                driver = drivers[i]
-                driver.current_route_id = route.id
-                driver.status = "active"
-                driver.hours_today = 0.0
-                db.commit()
-        
+        assign_off_duty_drivers(db)
         return db.query(models.Driver).all()
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,96 @@
+"""
+Runtime and peak memory of RouteOptimizer.optimize_route_with_constraints
+compared with the original dense (mask, pos, load) table.
+
+Run from the repository root:
+    python -m benchmarks.capacity_constrained
+
+Every case runs in its own interpreter so that the reported peak RSS
+belongs to that case alone. The dense engine is only run for small inputs.
+"""
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+import networkx as nx
+
+from dynamic_programming import RouteOptimizer
+
+CASES = [
+    # engine, stops, capacity
+    ("dense", 8, 50),
+    ("dense", 10, 50),
+    ("dense", 12, 50),
+    ("sparse", 8, 50),
+    ("sparse", 10, 50),
+    ("sparse", 15, 50),
+    ("sparse", 15, 80),
+    ("sparse", 18, 80),
+    ("sparse", 20, 80),
+]
+
+def random_instance(n: int, seed: int = 7):
+    """Stops on a plane; passengers board (positive) and alight (negative)"""
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 10, (n, 2))
+    cost_matrix = np.linalg.norm(points[:, np.newaxis] - points[np.newaxis], axis=2)
+    demands = rng.integers(-4, 8, n).astype(float)
+    demands[0] = 0
+    # Nobody can leave a bus that never had them on board
+    demands[np.argmin(demands)] -= min(demands.sum(), 0)
+    return cost_matrix, demands
+
+def dense_optimize(cost_matrix, demands, capacity):
+    """The original (1 << n, n, capacity + 1) table engine"""
+    n = len(cost_matrix)
+    dp = np.full((1 << n, n, int(capacity) + 1), np.inf)
+    parent = np.full((1 << n, n, int(capacity) + 1), -1)
+    dp[1][0][0] = 0
+    for mask in range(1 << n):
+        for pos in range(n):
+            if not (mask & (1 << pos)):
+                continue
+            for load in range(int(capacity) + 1):
+                if dp[mask][pos][load] == np.inf:
+                    continue
+                for next_pos in range(n):
+                    if mask & (1 << next_pos):
+                        continue
+                    new_load = load + int(demands[next_pos])
+                    if 0 <= new_load <= capacity:
+                        new_mask = mask | (1 << next_pos)
+                        if dp[new_mask][next_pos][new_load] > dp[mask][pos][load] + cost_matrix[pos][next_pos]:
+                            dp[new_mask][next_pos][new_load] = dp[mask][pos][load] + cost_matrix[pos][next_pos]
+                            parent[new_mask][next_pos][new_load] = pos
+    final = dp[(1 << n) - 1] + cost_matrix[:, 0][:, np.newaxis]
+    return float(final.min())
+
+def run_case(engine: str, n: int, capacity: int):
+    cost_matrix, demands = random_instance(n)
+    start = time.perf_counter()
+    if engine == "dense":
+        cost = dense_optimize(cost_matrix, demands, capacity)
+    else:
+        path = RouteOptimizer(nx.Graph()).optimize_route_with_constraints(cost_matrix, demands, capacity)
+        order = path + [0]
+        cost = float(cost_matrix[order[:-1], order[1:]].sum()) if path else float('inf')
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{engine},{n},{capacity},{elapsed:.3f},{peak_mb:.1f},{cost:.3f}")
+
+def main():
+    print(f"{'engine':>7} {'stops':>6} {'capacity':>9} {'time (s)':>9} {'peak RSS (MB)':>14} {'cost':>9}")
+    for engine, n, capacity in CASES:
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.capacity_constrained", "--case", engine, str(n), str(capacity)],
+            capture_output=True, text=True, check=True
+        )
+        engine, n, capacity, elapsed, peak_mb, cost = result.stdout.strip().split(",")
+        print(f"{engine:>7} {n:>6} {capacity:>9} {elapsed:>9} {peak_mb:>14} {cost:>9}")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--case":
+        run_case(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+    else:
+        main()
@@ -0,0 +1,63 @@
+"""
+Compare repairing cached shortest-path trees after edge weight changes
+(ShortestPathCache.update_edge_weight) with dropping and recomputing them.
+
+Run from the repository root:
+    python -m benchmarks.dynamic_shortest_paths [side] [sources] [updates]
+
+The network is a side x side grid of stops with random travel times; every update
+scales one random edge by 0.5-1.5x, as a congestion feed would. The recompute cost
+per update is one Dijkstra per cached source, timed once and multiplied out.
+"""
+import math
+import sys
+import time
+import networkx as nx
+import numpy as np
+
+from shortest_paths import ShortestPathCache
+
+DEFAULTS = [150, 50, 2000]
+
+def grid_network(side: int, seed: int = 42) -> nx.Graph:
+    rng = np.random.default_rng(seed)
+    graph = nx.convert_node_labels_to_integers(nx.grid_2d_graph(side, side))
+    for u, v in graph.edges:
+        graph[u][v]['weight'] = float(rng.uniform(1.0, 5.0))
+    return graph
+
+def main(side: int, sources: int, updates: int):
+    graph = grid_network(side)
+    rng = np.random.default_rng(7)
+    cache = ShortestPathCache(graph)
+    roots = rng.choice(graph.number_of_nodes(), sources, replace=False).tolist()
+
+    start = time.perf_counter()
+    for root in roots:
+        cache.tree(root)
+    recompute = time.perf_counter() - start
+
+    edges = list(graph.edges)
+    changes = [(*edges[i], graph.edges[edges[i]]['weight'] * factor)
+               for i, factor in zip(rng.integers(len(edges), size=updates), rng.uniform(0.5, 1.5, updates))]
+    start = time.perf_counter()
+    for u, v, weight in changes:
+        cache.update_edge_weight(u, v, weight)
+    incremental = (time.perf_counter() - start) / updates
+    kept = len(cache.trees)
+
+    # The repaired trees must match a fresh search
+    fresh = ShortestPathCache(graph)
+    for root in cache.trees:
+        dist, _ = cache.tree(root)
+        expected, _ = fresh.tree(root)
+        assert all(math.isclose(dist[node], expected[node]) for node in expected), "repaired tree differs"
+
+    print(f"{graph.number_of_nodes()} stops, {graph.number_of_edges()} connections, {sources} cached trees, "
+          f"{updates} updates")
+    print(f"recompute all trees: {recompute * 1e3:10.2f} ms per update")
+    print(f"incremental repair:  {incremental * 1e3:10.2f} ms per update  "
+          f"({recompute / incremental:.0f}x, {kept} of {sources} trees kept)")
+
+if __name__ == "__main__":
+    main(*([int(arg) for arg in sys.argv[1:]] + DEFAULTS[len(sys.argv) - 1:]))
@@ -0,0 +1,69 @@
+"""
+Simulate a full city-day: drivers are planned with DriverScheduler.schedule_day
+and the resulting trips are run through FleetSimulation.
+
+Run from the repository root:
+    python -m benchmarks.fleet_simulation [buses]
+
+The synthetic city has 5000 stops and 400 routes of 30 stops; every bus runs
+back-to-back trips from 05:00 to 23:00 and each driver has a 30 minute break.
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+from crowd_simulation import CrowdSimulator, Driver, DriverScheduler
+from fleet_simulation import FleetSimulation, Trip
+
+STOPS = 5000
+ROUTES = 400
+ROUTE_LENGTH = 30
+DEFAULT_BUSES = 3000
+
+def synthetic_city(buses: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    routes = {route_id: rng.choice(STOPS, ROUTE_LENGTH, replace=False).tolist() for route_id in range(ROUTES)}
+    route_minutes = {route_id: float(rng.uniform(40, 90)) for route_id in routes}
+
+    day_start = datetime(2024, 1, 1)
+    trips = []
+    for bus in range(buses):
+        route_id = int(rng.integers(ROUTES))
+        start = day_start + timedelta(hours=5, minutes=int(rng.integers(60)))
+        while start < day_start + timedelta(hours=23):
+            end = start + timedelta(minutes=route_minutes[route_id])
+            trips.append((route_id, start, end))
+            start = end + timedelta(minutes=10)
+
+    scheduler = DriverScheduler(max_hours=8.0)
+    for driver_id in range(buses * 3):
+        driver = Driver(driver_id, f"Driver {driver_id}")
+        driver.add_break_slot(day_start + timedelta(hours=int(rng.integers(6, 22))))
+        scheduler.add_driver(driver)
+    return routes, route_minutes, day_start, trips, scheduler
+
+def main(buses: int):
+    routes, route_minutes, day_start, trips, scheduler = synthetic_city(buses)
+
+    start = time.perf_counter()
+    # schedule_day treats the route as opaque, so pass route ids straight through
+    assignments, unassigned = scheduler.schedule_day(trips)
+    scheduled = time.perf_counter() - start
+
+    simulation = FleetSimulation(routes, route_minutes, CrowdSimulator(seed=1), seed=1)
+    start = time.perf_counter()
+    result = simulation.run([Trip(route_id, trip_start, 60, driver) for driver, route_id, trip_start in assignments],
+                            day_start)
+    simulated = time.perf_counter() - start
+
+    print(f"{buses} buses, {len(trips)} trips ({len(unassigned)} without a driver)")
+    print(f"schedule_day: {scheduled:.2f} s, simulation: {simulated:.2f} s")
+    for name, value in result.summary().items():
+        print(f"  {name}: {value}")
+    size = sum(getattr(result, name).nbytes for name in
+               ("time", "kind", "trip", "stop", "boarded", "alighted", "load", "left_behind"))
+    print(f"  event arrays: {size / 2 ** 20:.1f} MiB")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUSES)
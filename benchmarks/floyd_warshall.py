@@ -0,0 +1,77 @@
+"""
+Compare the vectorized RouteOptimizer.floyd_warshall against the original
+pure-Python triple loop.
+
+Run from the repository root:
+    python -m benchmarks.floyd_warshall
+
+The loop engine is only run to completion for small graphs; for larger ones a
+sample of intermediate nodes is timed and the total is extrapolated, since
+every iteration of the outer loop does the same amount of work.
+"""
+import sys
+import time
+import numpy as np
+import networkx as nx
+
+from dynamic_programming import RouteOptimizer
+
+SIZES = [100, 500, 2000]
+FULL_LOOP_LIMIT = 100
+SAMPLE_ITERATIONS = 5
+
+def random_network(n: int, seed: int = 42) -> nx.Graph:
+    """Sparse connected graph with positive weights and arbitrary (non 1..n) labels"""
+    rng = np.random.default_rng(seed)
+    graph = nx.connected_watts_strogatz_graph(n, 6, 0.2, seed=seed)
+    graph = nx.relabel_nodes(graph, {i: 1000 + 7 * i for i in graph.nodes})
+    for u, v in graph.edges:
+        graph[u][v]['weight'] = float(rng.uniform(0.1, 5.0))
+    return graph
+
+def loop_floyd_warshall(graph: nx.Graph, iterations: int = None):
+    """The original triple-loop engine, mapped onto arbitrary node labels"""
+    index = {node: i for i, node in enumerate(graph.nodes)}
+    n = len(index)
+    dist = np.full((n, n), np.inf)
+    pred = np.full((n, n), -1)
+    for u, v, data in graph.edges(data=True):
+        dist[index[u]][index[v]] = data['weight']
+        dist[index[v]][index[u]] = data['weight']
+        pred[index[u]][index[v]] = index[v]
+        pred[index[v]][index[u]] = index[u]
+    for i in range(n):
+        dist[i][i] = 0
+    for k in range(n if iterations is None else iterations):
+        for i in range(n):
+            for j in range(n):
+                if dist[i][k] + dist[k][j] < dist[i][j]:
+                    dist[i][j] = dist[i][k] + dist[k][j]
+                    pred[i][j] = pred[i][k]
+    return dist, pred
+
+def main(sizes):
+    print(f"{'n':>6} {'loop (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for n in sizes:
+        graph = random_network(n)
+
+        start = time.perf_counter()
+        dist, _ = RouteOptimizer(graph).floyd_warshall()
+        vectorized = time.perf_counter() - start
+
+        if n <= FULL_LOOP_LIMIT:
+            start = time.perf_counter()
+            loop_dist, _ = loop_floyd_warshall(graph)
+            loop = time.perf_counter() - start
+            assert np.allclose(dist, loop_dist), "vectorized result differs from loop engine"
+            label = f"{loop:.2f}"
+        else:
+            start = time.perf_counter()
+            loop_floyd_warshall(graph, iterations=SAMPLE_ITERATIONS)
+            loop = (time.perf_counter() - start) * n / SAMPLE_ITERATIONS
+            label = f"~{loop:.0f}"
+
+        print(f"{n:>6} {label:>12} {vectorized:>15.3f} {loop / vectorized:>8.0f}x")
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
@@ -1,8 +1,10 @@
 import numpy as np
 import networkx as nx
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 import matplotlib.pyplot as plt
 from map_integration import MapIntegration
+from shortest_paths import ShortestPathCache
+from dynamic_programming import solve_tsp, EXACT_TSP_LIMIT, TSPSolution
 
 class BusStop:
     def __init__(self, id: int, x: float, y: float, demand: float = 0.0):
@@ -23,6 +25,8 @@ class BusRoutingSystem:
         self.graph = nx.Graph()
         self.routes: List[BusRoute] = []
         self.map_integration = MapIntegration()
+        self.path_cache = ShortestPathCache(self.graph)
+        self.last_solution: Optional[TSPSolution] = None
         if area_name:
             self.map_integration.load_area(area_name)
         
@@ -37,26 +41,59 @@ class BusRoutingSystem:
         """Add a bus stop using an address"""
         lat, lon = self.map_integration.get_coordinates(address)
         return self.add_stop_from_coordinates(lat, lon, demand)
+
+    def add_stops_from_addresses(self, addresses: List[str], demands: List[float] = None) -> List[int]:
+        """
+        Add many bus stops from addresses in one batch
+        Addresses are geocoded from the local cache where possible and snapped together
+        Raises ValueError listing every address that could not be geocoded
+        """
+        if demands is None:
+            demands = [0.0] * len(addresses)
+        coordinates = self.map_integration.get_coordinates_many(addresses)
+        missing = [address for address, coords in zip(addresses, coordinates) if coords is None]
+        if missing:
+            raise ValueError(f"Could not find coordinates for addresses: {missing}")
+        if not addresses:
+            return []
+
+        lats, lons = zip(*coordinates)
+        node_ids, _ = self.map_integration.snap_many(lats, lons)
+        for node_id, lat, lon, demand in zip(node_ids, lats, lons, demands):
+            self.add_stop(BusStop(int(node_id), lon, lat, demand))
+        return [int(node_id) for node_id in node_ids]
         
     def add_stop(self, stop: BusStop):
         """Add a bus stop to the system"""
         self.stops[stop.id] = stop
         self.graph.add_node(stop.id, pos=(stop.x, stop.y))
+        self.path_cache.invalidate()
         
     def add_connection(self, stop1_id: int, stop2_id: int, distance: float = None):
         """Add a connection between two stops with given distance"""
-        if distance is None and self.map_integration.graph is not None:
+        if distance is None and self.map_integration.road_graph is not None:
             # Calculate real-world distance using OpenStreetMap
-            try:
-                path = nx.shortest_path(self.map_integration.graph, stop1_id, stop2_id, weight='length')
-                distance = sum(self.map_integration.graph[u][v][0]['length'] for u, v in zip(path[:-1], path[1:]))
-            except nx.NetworkXNoPath:
+            distance = self.map_integration.road_distance(stop1_id, stop2_id)
+            if np.isinf(distance):
                 # If no path exists, use straight-line distance
                 stop1 = self.stops[stop1_id]
                 stop2 = self.stops[stop2_id]
                 distance = np.sqrt((stop1.x - stop2.x)**2 + (stop1.y - stop2.y)**2)
+        if distance is None:
+            raise ValueError(f"No distance given between stops {stop1_id} and {stop2_id} and no road network loaded")
         
-        self.graph.add_edge(stop1_id, stop2_id, weight=distance)
+        # Cached shortest-path trees are repaired for the new edge rather than recomputed
+        self.path_cache.update_edge_weight(stop1_id, stop2_id, distance)
+
+    def update_edge_weight(self, stop1_id: int, stop2_id: int, weight: float):
+        """
+        Change the travel cost of an existing connection, e.g. from a live congestion feed
+        Cached shortest-path trees are repaired in place, so later find_optimal_route calls
+        stay as cheap as before the change
+        """
+        if not self.graph.has_edge(stop1_id, stop2_id):
+            raise nx.NetworkXError(f"No connection between stops {stop1_id} and {stop2_id}")
+        self.path_cache.update_edge_weight(stop1_id, stop2_id, weight)
         
     def update_demand(self, stop_id: int, new_demand: float):
         """Update the demand at a specific stop"""
@@ -81,47 +118,19 @@ class BusRoutingSystem:
 
     def find_optimal_route(self, start_stop: int, end_stop: int) -> List[int]:
         """
-        Find the optimal route between two stops using dynamic programming
+        Find the optimal route between two stops
+        Uses a cached Dijkstra shortest-path tree per start stop, so repeated
+        queries from the same origin are answered without searching again.
         Returns the list of stop IDs in the optimal route
         """
-        # Get all stops in the network
-        stops = list(self.stops.keys())
-        n = len(stops)
-        
-        # Initialize DP table
-        dp = np.full((n, n), float('inf'))
-        next_stop = np.full((n, n), -1)
-        
-        # Base case: direct connections
-        for i in range(n):
-            for j in range(n):
-                if self.graph.has_edge(stops[i], stops[j]):
-                    dp[i][j] = self.graph[stops[i]][stops[j]]['weight']
-                    next_stop[i][j] = j
-        
-        # Dynamic Programming: Floyd-Warshall algorithm
-        for k in range(n):
-            for i in range(n):
-                for j in range(n):
-                    if dp[i][k] + dp[k][j] < dp[i][j]:
-                        dp[i][k] + dp[k][j]
-                        next_stop[i][j] = next_stop[i][k]
-        
-        # Reconstruct the path
-        path = []
-        current = stops.index(start_stop)
-        end = stops.index(end_stop)
-        
-        while current != end:
-            path.append(stops[current])
-            current = next_stop[current][end]
-        path.append(stops[end])
-        
-        return path
+        return self.path_cache.path(start_stop, end_stop)
 
-    def optimize_route_with_demand(self, route: BusRoute) -> List[int]:
+    def optimize_route_with_demand(self, route: BusRoute,
+                                   exact_limit: int = EXACT_TSP_LIMIT) -> List[int]:
         """
         Optimize a bus route considering demand at stops
+        Routes longer than exact_limit stops are solved heuristically;
+        the mode used and the solve time are kept in self.last_solution
         Returns the optimized sequence of stop IDs
         """
         n = len(route.stops)
@@ -137,38 +146,9 @@ class BusRoutingSystem:
                     demand_factor = 1 / (route.stops[j].demand + 1)  # Avoid division by zero
                     cost_matrix[i][j] = distance * demand_factor
         
-        # Use dynamic programming to find the optimal sequence
-        dp = np.full((1 << n, n), float('inf'))
-        parent = np.full((1 << n, n), -1)
-        
-        # Base case: start from the first stop
-        dp[1][0] = 0
-        
-        # Dynamic Programming
-        for mask in range(1 << n):
-            for i in range(n):
-                if not (mask & (1 << i)):
-                    continue
-                for j in range(n):
-                    if mask & (1 << j):
-                        continue
-                    new_mask = mask | (1 << j)
-                    if dp[new_mask][j] > dp[mask][i] + cost_matrix[i][j]:
-                        dp[new_mask][j] = dp[mask][i] + cost_matrix[i][j]
-                        parent[new_mask][j] = i
-        
-        # Reconstruct the path
-        path = []
-        mask = (1 << n) - 1
-        current = n - 1
-        
-        while current != -1:
-            path.append(route.stops[current].id)
-            new_current = parent[mask][current]
-            mask ^= (1 << current)
-            current = new_current
-            
-        return path[::-1]  # Reverse to get the correct order
+        # Use dynamic programming to find the optimal sequence from the first to the last stop
+        self.last_solution = solve_tsp(cost_matrix, end=n - 1, exact_limit=exact_limit)
+        return [route.stops[i].id for i in self.last_solution.path]
 
 if __name__ == "__main__":
     # Example usage with OpenStreetMap
@@ -0,0 +1,188 @@
+import asyncio
+import math
+from datetime import datetime, timedelta
+from typing import List, Tuple, Dict
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+
+# Rollup bucket sizes in seconds, finest first
+RESOLUTIONS = [60, 900, 3600]
+
+# How long each tier is kept; 0 is the raw crowd_data table
+RETENTION = {
+    0: timedelta(days=2),
+    60: timedelta(days=7),
+    900: timedelta(days=90),
+    3600: timedelta(days=730),
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+def ensure_schema(bind):
+    """Create the history indexes and rollup table on databases created before they existed"""
+    models.CrowdDataRollup.__table__.create(bind=bind, checkfirst=True)
+    for index in models.CrowdData.__table__.indexes:
+        index.create(bind=bind, checkfirst=True)
+
+def bucket_start(timestamp: datetime, resolution: int) -> datetime:
+    seconds = (timestamp - EPOCH).total_seconds()
+    return EPOCH + timedelta(seconds=math.floor(seconds / resolution) * resolution)
+
+def record_densities(db: Session, readings: List[Tuple[int, float, datetime]]):
+    """
+    Append density readings to the raw history and fold them into every rollup tier
+    Does not commit, so the caller can write the readings in its own transaction
+    Args:
+        readings: (stop_id, density, timestamp) triples
+    """
+    if not readings:
+        return
+    db.execute(
+        insert(models.CrowdData),
+        [{"stop_id": stop_id, "density": density, "timestamp": timestamp}
+         for stop_id, density, timestamp in readings]
+    )
+
+    # Aggregate the batch first so each bucket is upserted once
+    buckets: Dict[Tuple[int, int, datetime], list] = {}
+    for stop_id, density, timestamp in readings:
+        for resolution in RESOLUTIONS:
+            key = (resolution, stop_id, bucket_start(timestamp, resolution))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [1, density, density, density]
+            else:
+                bucket[0] += 1
+                bucket[1] += density
+                bucket[2] = min(bucket[2], density)
+                bucket[3] = max(bucket[3], density)
+
+    rows = [{"resolution": resolution, "stop_id": stop_id, "bucket_start": start,
+             "count": count, "density_sum": total, "density_min": low, "density_max": high}
+            for (resolution, stop_id, start), (count, total, low, high) in buckets.items()]
+    db.execute(_rollup_upsert(db), rows)
+
+def _rollup_upsert(db: Session):
+    """INSERT ... ON CONFLICT that merges a batch into existing rollup buckets"""
+    table = models.CrowdDataRollup.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        stmt, least, greatest = postgresql.insert(table), func.least, func.greatest
+    else:
+        stmt, least, greatest = sqlite.insert(table), func.min, func.max
+    return stmt.on_conflict_do_update(
+        index_elements=["resolution", "stop_id", "bucket_start"],
+        set_={
+            "count": table.c.count + stmt.excluded.count,
+            "density_sum": table.c.density_sum + stmt.excluded.density_sum,
+            "density_min": least(table.c.density_min, stmt.excluded.density_min),
+            "density_max": greatest(table.c.density_max, stmt.excluded.density_max),
+        }
+    )
+
+def compact(db: Session, now: datetime = None) -> Dict[int, int]:
+    """
+    Apply the retention policy: drop raw readings and rollup buckets older than
+    their tier's RETENTION. Returns the number of rows removed per tier
+    """
+    now = now or datetime.utcnow()
+    removed = {}
+    removed[0] = db.query(models.CrowdData).filter(
+        models.CrowdData.timestamp < now - RETENTION[0]
+    ).delete(synchronize_session=False)
+    for resolution in RESOLUTIONS:
+        removed[resolution] = db.query(models.CrowdDataRollup).filter(
+            models.CrowdDataRollup.resolution == resolution,
+            models.CrowdDataRollup.bucket_start < now - RETENTION[resolution]
+        ).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+async def run_compaction(session_factory, interval: float = 3600):
+    """Background task applying the retention policy every interval seconds"""
+    loop = asyncio.get_running_loop()
+    while True:
+        def run():
+            db = session_factory()
+            try:
+                return compact(db)
+            finally:
+                db.close()
+        try:
+            await loop.run_in_executor(None, run)
+        except Exception as e:
+            print(f"Error compacting crowd history: {e}")
+        await asyncio.sleep(interval)
+
+def source_resolution(resolution: int, start: datetime = None, now: datetime = None) -> int:
+    """
+    Tier to read a query from: the coarsest tier whose buckets nest exactly in buckets of
+    the requested resolution (0 for raw readings, which nest in any), among the tiers that
+    are still retained at start. When none of those nests, the finest retained tier, which
+    is coarser than the request. When start is older than every tier, the longest kept one
+    """
+    tiers = [0] + RESOLUTIONS
+    if start is not None:
+        now = now or datetime.utcnow()
+        retained = [tier for tier in tiers if start >= now - RETENTION[tier]]
+        tiers = retained or [max(tiers, key=RETENTION.get)]
+    nesting = [tier for tier in tiers if tier == 0 or resolution % tier == 0]
+    return max(nesting) if nesting else min(tiers)
+
+def query_history(db: Session, stop_id: int, start: datetime, end: datetime,
+                  resolution: int, now: datetime = None) -> dict:
+    """
+    Density history of a stop between start and end in buckets of resolution seconds
+    Reads from the tier picked by source_resolution and merges its buckets further when
+    the requested resolution is coarser. When start is past the retention of every tier
+    fine enough for the request, the buckets are widened to the nearest multiple of the
+    source tier, reported as "resolution" next to "requested_resolution"
+    """
+    source = source_resolution(resolution, start, now)
+    requested = resolution
+    if source and resolution % source:
+        resolution = -(-resolution // source) * source
+    if source == 0:
+        rows = db.query(
+            models.CrowdData.timestamp, models.CrowdData.density
+        ).filter(
+            models.CrowdData.stop_id == stop_id,
+            models.CrowdData.timestamp >= start,
+            models.CrowdData.timestamp < end
+        ).order_by(models.CrowdData.timestamp).all()
+        rows = [(timestamp, 1, density, density, density) for timestamp, density in rows]
+    else:
+        rollup = models.CrowdDataRollup
+        rows = db.query(
+            rollup.bucket_start, rollup.count, rollup.density_sum, rollup.density_min, rollup.density_max
+        ).filter(
+            rollup.resolution == source,
+            rollup.stop_id == stop_id,
+            rollup.bucket_start >= bucket_start(start, source),
+            rollup.bucket_start < end
+        ).order_by(rollup.bucket_start).all()
+
+    points: Dict[datetime, list] = {}
+    for timestamp, count, total, low, high in rows:
+        key = bucket_start(timestamp, resolution)
+        point = points.get(key)
+        if point is None:
+            points[key] = [count, total, low, high]
+        else:
+            point[0] += count
+            point[1] += total
+            point[2] = min(point[2], low)
+            point[3] = max(point[3], high)
+
+    return {
+        "stop_id": stop_id,
+        "requested_resolution": requested,
+        "resolution": resolution,
+        "source_resolution": source,
+        "points": [
+            {"timestamp": timestamp, "count": count, "avg": total / count, "min": low, "max": high}
+            for timestamp, (count, total, low, high) in points.items()
+        ]
+    }
@@ -1,11 +1,14 @@
+import bisect
+import heapq
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Dict, Tuple
-import random
+from typing import List, Dict, Tuple, Iterator, Optional
 
 class CrowdSimulator:
-    def __init__(self, base_density: float = 100.0):
+    def __init__(self, base_density: float = 100.0, seed: int = None):
         self.base_density = base_density
+        # Seeded generator so that simulated scenarios are reproducible
+        self.rng = np.random.default_rng(seed)
         self.time_factors = {
             0: 0.3,  # 12 AM
             1: 0.2,
@@ -35,27 +38,83 @@ class CrowdSimulator:
         
     def get_current_density(self, stop_id: int) -> float:
         """Simulate crowd density based on time and location"""
-        current_hour = datetime.now().hour
-        time_factor = self.time_factors[current_hour]
-        
-        # Add some randomness based on stop location
-        location_factor = 1.0 + (stop_id % 5) * 0.2  # Different stops have different base densities
-        
+        return float(self.get_current_densities([stop_id])[0])
+
+    def get_current_densities(self, stop_ids) -> np.ndarray:
+        """Simulate the current crowd density of many stops in one vectorized call"""
+        return self.get_densities(stop_ids, [datetime.now()])[0]
+
+    def get_densities(self, stop_ids, timestamps) -> np.ndarray:
+        """
+        Simulate crowd density for every stop at every timestamp
+        Args:
+            stop_ids: Array of stop IDs
+            timestamps: Array of datetimes or numpy datetime64 values
+        Returns:
+            Matrix of shape (len(timestamps), len(stop_ids))
+        """
+        stop_ids = np.asarray(stop_ids, dtype=np.int64)
+        hours = np.asarray(timestamps, dtype='datetime64[h]').astype(np.int64) % 24
+        hour_factors = np.array([self.time_factors[hour] for hour in range(24)])
+
+        time_factor = hour_factors[hours][:, np.newaxis]
+        # Different stops have different base densities
+        location_factor = 1.0 + (stop_ids % 5) * 0.2
         # Add some random variation
-        random_factor = random.uniform(0.8, 1.2)
-        
+        random_factor = self.rng.uniform(0.8, 1.2, size=(len(hours), len(stop_ids)))
+
         return self.base_density * time_factor * location_factor * random_factor
 
+    def stream_densities(self, stop_ids, start: datetime, end: datetime,
+                         step: timedelta = timedelta(minutes=5),
+                         chunk_size: int = 288) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Simulate densities from start (inclusive) to end (exclusive) in chunks,
+        so long scenarios never hold the whole matrix in memory
+        Yields:
+            - datetime64 timestamps of the chunk
+            - density matrix of shape (len(timestamps), len(stop_ids))
+        """
+        step = np.timedelta64(step)
+        current = np.datetime64(start)
+        end = np.datetime64(end)
+        while current < end:
+            timestamps = np.arange(current, min(current + step * chunk_size, end), step)
+            yield timestamps, self.get_densities(stop_ids, timestamps)
+            current = current + step * chunk_size
+
 class Driver:
     def __init__(self, id: int, name: str):
         self.id = id
         self.name = name
         self.current_bus = None
         self.current_route = None
-        self.break_slots = []  # List of (start_time, end_time) tuples
         self.total_hours = 0
         self.is_on_break = False
-        
+        # Set by the DriverScheduler that tracks this driver; called with (driver, slot) after
+        # add_break_slot and with (driver, None) when the slots are replaced wholesale
+        self.on_breaks_changed = None
+        self._break_slots = []  # (start_time, end_time) tuples, sorted by start
+        self._break_starts = []
+        self._latest_end = []  # latest end among _break_slots[:i + 1]
+        self._slots_view = ()
+
+    @property
+    def break_slots(self) -> Tuple[Tuple[datetime, datetime], ...]:
+        """(start_time, end_time) of every break, sorted by start; read-only, use add_break_slot"""
+        return self._slots_view
+
+    @break_slots.setter
+    def break_slots(self, slots):
+        self._break_slots = sorted((start, end) for start, end in slots)
+        self._break_starts = [start for start, _ in self._break_slots]
+        self._latest_end = []
+        for _, end in self._break_slots:
+            self._latest_end.append(max(end, self._latest_end[-1]) if self._latest_end else end)
+        self._slots_view = tuple(self._break_slots)
+        if self.on_breaks_changed is not None:
+            self.on_breaks_changed(self, None)
+
     def assign_bus(self, bus_id: int, route: List[int], start_time: datetime):
         self.current_bus = bus_id
         self.current_route = route
@@ -63,25 +122,129 @@ class Driver:
         
     def add_break_slot(self, start_time: datetime, duration_minutes: int = 30):
         end_time = start_time + timedelta(minutes=duration_minutes)
-        self.break_slots.append((start_time, end_time))
+        idx = bisect.bisect_right(self._break_starts, start_time)
+        self._break_slots.insert(idx, (start_time, end_time))
+        self._break_starts.insert(idx, start_time)
+        self._latest_end.insert(idx, end_time)
+        for i in range(idx, len(self._break_slots)):
+            self._latest_end[i] = max(self._break_slots[i][1], self._latest_end[i - 1]) if i else self._break_slots[i][1]
+        self._slots_view = tuple(self._break_slots)
+        if self.on_breaks_changed is not None:
+            self.on_breaks_changed(self, (start_time, end_time))
         
     def is_break_time(self, current_time: datetime) -> bool:
-        for start, end in self.break_slots:
-            if start <= current_time <= end:
-                return True
-        return False
+        return self.overlaps_break(current_time, current_time)
+
+    def overlaps_break(self, start_time: datetime, end_time: datetime) -> bool:
+        """Whether any break slot intersects [start_time, end_time], in O(log slots)"""
+        return self.break_clash_end(start_time, end_time) is not None
+
+    def break_clash_end(self, start_time: datetime, end_time: datetime) -> Optional[datetime]:
+        """When the breaks intersecting [start_time, end_time] are over, or None if there are none"""
+        idx = bisect.bisect_right(self._break_starts, end_time) - 1
+        if idx >= 0 and self._latest_end[idx] >= start_time:
+            return self._latest_end[idx]
+        return None
+
+class IntervalTree:
+    """
+    Static centered interval tree over closed intervals [start, end] tagged with a key.
+    stab(t) returns the keys of all intervals containing t in O(log n + k).
+    """
+    def __init__(self, intervals: List[Tuple[datetime, datetime, int]]):
+        self.root = self._build(list(intervals))
+
+    def _build(self, intervals):
+        if not intervals:
+            return None
+        points = sorted(point for start, end, _ in intervals for point in (start, end))
+        center = points[len(points) // 2]
+        here = [interval for interval in intervals if interval[0] <= center <= interval[1]]
+        return (
+            center,
+            sorted(here, key=lambda interval: interval[0]),                # by start, ascending
+            sorted(here, key=lambda interval: interval[1], reverse=True),  # by end, descending
+            self._build([interval for interval in intervals if interval[1] < center]),
+            self._build([interval for interval in intervals if interval[0] > center])
+        )
+
+    def stab(self, t: datetime) -> List[int]:
+        keys = []
+        node = self.root
+        while node is not None:
+            center, by_start, by_end, left, right = node
+            if t < center:
+                for start, _, key in by_start:
+                    if start > t:
+                        break
+                    keys.append(key)
+                node = left
+            elif t > center:
+                for _, end, key in by_end:
+                    if end < t:
+                        break
+                    keys.append(key)
+                node = right
+            else:
+                keys.extend(key for _, _, key in by_start)
+                break
+        return keys
 
 class DriverScheduler:
-    def __init__(self):
+    """
+    Assigns drivers to routes around their break slots.
+    All break slots are indexed in an IntervalTree. Slots added afterwards wait in a short
+    pending list that queries scan, and the tree is rebuilt lazily on the next query once
+    that list outgrows BREAK_REBUILD_MIN or the square root of the tree size, so
+    "who is free at t" costs O(log slots + sqrt(slots) + drivers on break at t).
+    schedule_day() plans a whole day of trips with a sweep over trip start times.
+    """
+    BREAK_REBUILD_MIN = 16
+
+    def __init__(self, max_hours: float = 8.0):
         self.drivers: List[Driver] = []
+        self.max_hours = max_hours
         self.break_stops = {
             1: "Swargate Bus Terminal",
             2: "Pune Station Bus Stand",
             3: "Kharadi Bus Stand"
         }
+        self._driver_index: Dict[Driver, int] = {}
+        self._break_tree = None
+        self._tree_size = 0
+        self._pending_breaks: List[Tuple[datetime, datetime, int]] = []
         
     def add_driver(self, driver: Driver):
+        driver.on_breaks_changed = self._breaks_changed
+        self._driver_index[driver] = len(self.drivers)
         self.drivers.append(driver)
+        for start, end in driver.break_slots:
+            self._breaks_changed(driver, (start, end))
+
+    def _breaks_changed(self, driver: Driver, slot: Optional[Tuple[datetime, datetime]]):
+        if self._break_tree is None:
+            return  # everything is indexed on the next query
+        if slot is None:
+            self._break_tree = None
+            self._pending_breaks = []
+        else:
+            self._pending_breaks.append((slot[0], slot[1], self._driver_index[driver]))
+
+    def _breaks(self) -> IntervalTree:
+        rebuild_at = max(self.BREAK_REBUILD_MIN, int(self._tree_size ** 0.5))
+        if self._break_tree is None or len(self._pending_breaks) > rebuild_at:
+            intervals = [(start, end, idx) for idx, driver in enumerate(self.drivers)
+                         for start, end in driver.break_slots]
+            self._break_tree = IntervalTree(intervals)
+            self._tree_size = len(intervals)
+            self._pending_breaks = []
+        return self._break_tree
+
+    def _on_break(self, t: datetime) -> set:
+        """Indices of the drivers on break at t"""
+        on_break = set(self._breaks().stab(t))
+        on_break.update(idx for start, end, idx in self._pending_breaks if start <= t <= end)
+        return on_break
         
     def assign_breaks(self, driver: Driver, route: List[int]):
         """Assign break slots at designated stops"""
@@ -98,12 +261,17 @@ class DriverScheduler:
                 # Calculate approximate time to reach break stop
                 break_time = datetime.now() + timedelta(hours=i*2)  # Simulated time
                 driver.add_break_slot(break_time)
+
+    def drivers_on_break(self, current_time: datetime) -> List[Driver]:
+        return [self.drivers[idx] for idx in self._on_break(current_time)]
                 
     def get_available_driver(self, current_time: datetime) -> Driver:
         """Find an available driver who is not on break"""
-        for driver in self.drivers:
-            if not driver.is_break_time(current_time):
-                return driver
+        on_break = self._on_break(current_time)
+        # The first driver not on break is among the first len(on_break) + 1
+        for idx in range(min(len(on_break) + 1, len(self.drivers))):
+            if idx not in on_break:
+                return self.drivers[idx]
         return None
         
     def schedule_drivers(self, routes: List[List[int]], start_time: datetime):
@@ -121,6 +289,52 @@ class DriverScheduler:
                 
         return assignments
 
+    def schedule_day(self, trips: List[Tuple[List[int], datetime, datetime]]
+                     ) -> Tuple[List[Tuple[Driver, List[int], datetime]], List[Tuple[List[int], datetime, datetime]]]:
+        """
+        Plan a whole day of trips at once
+        Trips are swept in start order. Drivers wait in a heap keyed by the time their
+        current trip or break ends; idle drivers are handed out least-worked first as long
+        as the trip fits within max_hours. A driver whose break falls within the trip is
+        sent on that break instead, so the sweep pops O(trips + breaks) drivers in total
+        Args:
+            trips: (route, start, end) of every trip
+        Returns:
+            - (driver, route, start) for every assigned trip, in start order
+            - trips no driver could take
+        """
+        busy = []  # (free_at, driver index)
+        idle = [(driver.total_hours, idx) for idx, driver in enumerate(self.drivers)]
+        heapq.heapify(idle)
+        assignments, unassigned = [], []
+
+        for route, start, end in sorted(trips, key=lambda trip: (trip[1], trip[2])):
+            while busy and busy[0][0] <= start:
+                _, idx = heapq.heappop(busy)
+                heapq.heappush(idle, (self.drivers[idx].total_hours, idx))
+
+            hours = (end - start).total_seconds() / 3600
+            chosen = None
+            # Idle drivers come out least-worked first, so once one is out of hours all are
+            while idle and idle[0][0] + hours <= self.max_hours:
+                _, idx = heapq.heappop(idle)
+                clash_end = self.drivers[idx].break_clash_end(start, end)
+                if clash_end is None:
+                    chosen = self.drivers[idx]
+                    break
+                # A driver whose break falls within the trip takes the break and is free after it
+                heapq.heappush(busy, (clash_end, idx))
+
+            if chosen is None:
+                unassigned.append((route, start, end))
+                continue
+            chosen.assign_bus(len(assignments) + 1, route, start)
+            chosen.total_hours += hours
+            heapq.heappush(busy, (end, idx))
+            assignments.append((chosen, route, start))
+
+        return assignments, unassigned
+
 if __name__ == "__main__":
     # Example usage
     simulator = CrowdSimulator()
@@ -0,0 +1,130 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Tuple, Dict, Optional
+import numpy as np
+from sqlalchemy.orm import Session
+
+import models
+from crowd_simulation import CrowdSimulator
+
+class DensityForecaster:
+    """
+    Online crowd density forecast built from per-stop, per-hour-of-day profiles.
+    Each profile starts from the CrowdSimulator time_factors and is updated with an
+    exponentially weighted moving average of the observed densities. The forecast
+    for the next `horizon` hours is kept as a NumPy array and only the entries touched
+    by new observations are refreshed.
+    """
+    def __init__(self, simulator: CrowdSimulator, alpha: float = 0.2, horizon: int = 24):
+        self.simulator = simulator
+        self.alpha = alpha
+        self.horizon = horizon
+        self.lock = threading.Lock()
+        self.rows: Dict[int, int] = {}  # stop id -> row of profiles
+        self.stop_ids = np.zeros(0, dtype=np.int64)
+        self.profiles = np.zeros((0, 24))
+        self._cache: Optional[np.ndarray] = None
+        self._cache_start: Optional[datetime] = None
+
+    def _prior(self, stop_ids: np.ndarray) -> np.ndarray:
+        hour_factors = np.array([self.simulator.time_factors[hour] for hour in range(24)])
+        location_factor = 1.0 + (stop_ids % 5) * 0.2
+        return self.simulator.base_density * location_factor[:, np.newaxis] * hour_factors
+
+    def _rows_for(self, stop_ids) -> np.ndarray:
+        """Rows of the given stops, adding unseen stops with their prior profile"""
+        new_ids = np.array([stop_id for stop_id in dict.fromkeys(stop_ids) if stop_id not in self.rows],
+                           dtype=np.int64)
+        if len(new_ids):
+            for offset, stop_id in enumerate(new_ids):
+                self.rows[int(stop_id)] = len(self.stop_ids) + offset
+            self.stop_ids = np.concatenate((self.stop_ids, new_ids))
+            self.profiles = np.vstack((self.profiles, self._prior(new_ids)))
+            self._cache = None
+        return np.array([self.rows[stop_id] for stop_id in stop_ids], dtype=np.int64)
+
+    def warm_start(self, db: Session, days: int = 14):
+        """Track every stop and seed the profiles with the hourly rollups of the last `days` days"""
+        all_stop_ids = sorted(row[0] for row in db.query(models.BusStop.id))
+        with self.lock:
+            self._rows_for(all_stop_ids)
+
+        since = datetime.utcnow() - timedelta(days=days)
+        rollup = models.CrowdDataRollup
+        rows = db.query(
+            rollup.stop_id, rollup.bucket_start, rollup.count, rollup.density_sum
+        ).filter(rollup.resolution == 3600, rollup.bucket_start >= since).all()
+        if not rows:
+            return
+        stop_ids = [stop_id for stop_id, _, _, _ in rows]
+        # Rollups are bucketed in UTC while profiles follow local time like the simulator
+        utc_offset = timedelta(seconds=round((datetime.now() - datetime.utcnow()).total_seconds() / 900) * 900)
+        with self.lock:
+            profile_rows = self._rows_for(stop_ids)
+            totals = np.zeros_like(self.profiles)
+            counts = np.zeros_like(self.profiles)
+            hours = np.array([(start + utc_offset).hour for _, start, _, _ in rows])
+            np.add.at(totals, (profile_rows, hours), [total for _, _, _, total in rows])
+            np.add.at(counts, (profile_rows, hours), [count for _, _, count, _ in rows])
+            seen = counts > 0
+            self.profiles[seen] = totals[seen] / counts[seen]
+            self._cache = None
+
+    def observe(self, densities: Dict[int, float], timestamp: datetime = None):
+        """Fold a batch of observed densities into the profile of their hour"""
+        if not densities:
+            return
+        timestamp = timestamp or datetime.now()
+        with self.lock:
+            rows = self._rows_for(list(densities))
+            hour = timestamp.hour
+            values = np.fromiter(densities.values(), dtype=np.float64, count=len(densities))
+            self.profiles[rows, hour] += self.alpha * (values - self.profiles[rows, hour])
+
+            # Refresh only the cached forecast entries for this hour of day
+            if self._cache is not None:
+                offset = (hour - self._cache_start.hour) % 24
+                for column in range(offset, self.horizon, 24):
+                    self._cache[rows, column] = self.profiles[rows, hour]
+
+    def forecast(self, hours: int = None, now: datetime = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predicted density of every known stop for the next `hours` hours
+        Returns:
+            - stop ids, one per row
+            - matrix of shape (stops, hours); column 0 is the current hour
+        """
+        hours = hours or self.horizon
+        now = (now or datetime.now()).replace(minute=0, second=0, microsecond=0)
+        with self.lock:
+            if self._cache is None or self._cache_start != now or self._cache.shape[1] < hours:
+                self.horizon = max(self.horizon, hours)
+                columns = (now.hour + np.arange(self.horizon)) % 24
+                self._cache = self.profiles[:, columns]
+                self._cache_start = now
+            return self.stop_ids.copy(), self._cache[:, :hours].copy()
+
+    def density_lookup(self, now: datetime = None) -> Callable[[int, float], float]:
+        """
+        (stop_id, minutes from now) -> predicted density, frozen at the time of the call so
+        later observations do not change it; stops without a profile get their prior
+        """
+        now = now or datetime.now()
+        hour_start = now.replace(minute=0, second=0, microsecond=0)
+        stop_ids, densities = self.forecast(24, now)
+        rows = {int(stop_id): row for row, stop_id in enumerate(stop_ids)}
+
+        def density_at(stop_id: int, minutes: float) -> float:
+            # Profiles repeat every day, so column h % 24 holds any hour h from now
+            column = int((now - hour_start + timedelta(minutes=minutes)).total_seconds() // 3600) % 24
+            row = rows.get(stop_id)
+            if row is None:
+                return float(self._prior(np.array([stop_id], dtype=np.int64))[0, (hour_start.hour + column) % 24])
+            return float(densities[row, column])
+        return density_at
+
+    def expected_density(self, stop_id: int, at: datetime) -> float:
+        """Predicted density of one stop at a given time"""
+        with self.lock:
+            row = self._rows_for([stop_id])[0]
+            return float(self.profiles[row, at.hour])
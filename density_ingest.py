@@ -0,0 +1,99 @@
+import threading
+import time
+from datetime import datetime
+from typing import List, Tuple, Dict, Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import models
+from crowd_history import record_densities
+
+# Keep IN (...) lists well below SQLite's bound parameter limit
+ID_CHUNK_SIZE = 500
+
+class IngestStats:
+    """Throughput counters for density ingestion, shared by all requests"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.readings = 0
+        self.stops_updated = 0
+        self.unknown_stops = 0
+        self.seconds = 0.0
+        self.last_batch_at: Optional[datetime] = None
+
+    def record(self, readings: int, stops_updated: int, unknown_stops: int, seconds: float):
+        with self.lock:
+            self.batches += 1
+            self.readings += readings
+            self.stops_updated += stops_updated
+            self.unknown_stops += unknown_stops
+            self.seconds += seconds
+            self.last_batch_at = datetime.utcnow()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "readings": self.readings,
+                "stops_updated": self.stops_updated,
+                "unknown_stops": self.unknown_stops,
+                "seconds": self.seconds,
+                "readings_per_second": self.readings / self.seconds if self.seconds else 0.0,
+                "last_batch_at": self.last_batch_at
+            }
+
+def existing_stop_ids(db: Session, stop_ids: List[int]) -> set:
+    """Subset of stop_ids present in the database"""
+    found = set()
+    for start in range(0, len(stop_ids), ID_CHUNK_SIZE):
+        chunk = stop_ids[start:start + ID_CHUNK_SIZE]
+        found.update(row[0] for row in db.query(models.BusStop.id).filter(models.BusStop.id.in_(chunk)))
+    return found
+
+def apply_density_updates(db: Session, readings: List[Tuple[int, float]],
+                          timestamp: datetime = None) -> Tuple[Dict[int, float], List[int]]:
+    """
+    Write a batch of density readings in a single transaction
+    Every reading for a known stop is appended to the crowd history and its rollups and each
+    stop's current_density is set to its last reading with one executemany UPDATE
+    Args:
+        readings: (stop_id, density) pairs in arrival order
+        timestamp: Time of the readings, defaults to now
+    Returns:
+        - new current density of every updated stop
+        - ids of unknown stops whose readings were skipped
+    """
+    timestamp = timestamp or datetime.utcnow()
+    latest: Dict[int, float] = {}
+    for stop_id, density in readings:
+        latest[stop_id] = density
+
+    known = existing_stop_ids(db, list(latest))
+    unknown = sorted(stop_id for stop_id in latest if stop_id not in known)
+    latest = {stop_id: density for stop_id, density in latest.items() if stop_id in known}
+    if not latest:
+        return latest, unknown
+
+    try:
+        db.execute(
+            update(models.BusStop),
+            [{"id": stop_id, "current_density": density, "updated_at": timestamp}
+             for stop_id, density in latest.items()]
+        )
+        record_densities(db, [(stop_id, density, timestamp)
+                              for stop_id, density in readings if stop_id in known])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return latest, unknown
+
+def ingest_densities(db: Session, readings: List[Tuple[int, float]], stats: IngestStats,
+                     timestamp: datetime = None) -> Tuple[Dict[int, float], List[int], float]:
+    """apply_density_updates() that also records throughput; returns the elapsed seconds too"""
+    start = time.perf_counter()
+    updated, unknown = apply_density_updates(db, readings, timestamp)
+    elapsed = time.perf_counter() - start
+    stats.record(len(readings), len(updated), len(unknown), elapsed)
+    return updated, unknown, elapsed
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import threading
+from typing import Dict, NamedTuple, Optional, Set
+from starlette.websockets import WebSocket
+
+# Idle SSE connections get a comment line this often so proxies keep them open
+KEEPALIVE_SECONDS = 15.0
+
+class StreamMessage(NamedTuple):
+    seq: int
+    kind: str  # "snapshot" or "delta"
+    json: str  # {"type", "seq", "densities": {stop_id: density}}
+    sse: str   # the same payload framed as a Server-Sent Event
+
+def _message(kind: str, seq: int, densities: Dict[int, float]) -> StreamMessage:
+    payload = json.dumps({"type": kind, "seq": seq, "densities": densities}, separators=(",", ":"))
+    return StreamMessage(seq, kind, payload, f"event: {kind}\nid: {seq}\ndata: {payload}\n\n")
+
+class DensityHub:
+    """
+    Fan-out of crowd density changes to streaming clients.
+    publish() may be called from any thread. Changes are coalesced for `window` seconds
+    (the latest value of each stop wins) and every batch is serialized once, then put on
+    the queue of each subscriber. New subscribers start from a snapshot of every stop;
+    one that falls max_backlog batches behind has its backlog replaced by a fresh snapshot.
+    """
+    def __init__(self, window: float = 0.25, max_backlog: int = 32):
+        self.window = window
+        self.max_backlog = max_backlog
+        self.lock = threading.Lock()
+        self.pending: Dict[int, float] = {}
+        self.densities: Dict[int, float] = {}  # state after the last batch; only touched on the event loop
+        self.seq = 0
+        self.subscribers: Set[asyncio.Queue] = set()
+        self._snapshot: Optional[StreamMessage] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.resyncs = 0
+
+    def reset(self, densities: Dict[int, float]):
+        """Replace the current state of every stop, e.g. after the network index is rebuilt"""
+        with self.lock:
+            self.pending.clear()
+        self.densities = dict(densities)
+        self._snapshot = None
+
+    def publish(self, densities: Dict[int, float]):
+        """Queue density changes for the next batch; safe to call from any thread"""
+        if not densities:
+            return
+        with self.lock:
+            self.pending.update(densities)
+            loop = self.loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self.wakeup.set)
+
+    def start(self):
+        if self.task is None:
+            self.loop = asyncio.get_running_loop()
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+            with self.lock:
+                if self.pending:
+                    self.wakeup.set()
+
+    async def stop(self):
+        if self.task is not None:
+            with self.lock:
+                self.loop = None
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            # Give the rest of a burst time to arrive so it goes out as one batch
+            await asyncio.sleep(self.window)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Send the pending changes to every subscriber as one delta"""
+        with self.lock:
+            changes, self.pending = self.pending, {}
+        if not changes:
+            return
+        self.densities.update(changes)
+        self.seq += 1
+        self._snapshot = None
+        self.batches += 1
+        message = _message("delta", self.seq, changes)
+        for queue in self.subscribers:
+            if queue.full():
+                # Too far behind: drop its backlog and let it start over from the current state
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot())
+                self.resyncs += 1
+            else:
+                queue.put_nowait(message)
+
+    def snapshot(self) -> StreamMessage:
+        """Density of every stop as of the last batch, serialized once per batch"""
+        if self._snapshot is None:
+            self._snapshot = _message("snapshot", self.seq, self.densities)
+        return self._snapshot
+
+    def subscribe(self) -> "asyncio.Queue[StreamMessage]":
+        queue = asyncio.Queue(maxsize=self.max_backlog)
+        queue.put_nowait(self.snapshot())
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    async def sse_events(self):
+        """Server-Sent Events for one client, starting with a snapshot"""
+        queue = self.subscribe()
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield message.sse
+        finally:
+            self.unsubscribe(queue)
+
+    async def serve_websocket(self, websocket: WebSocket):
+        """Send every message to an accepted WebSocket as JSON text until the client goes away"""
+        queue = self.subscribe()
+
+        async def send():
+            while True:
+                await websocket.send_text((await queue.get()).json)
+
+        async def receive():
+            # Client messages are ignored; reading them is how a disconnect is noticed
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+
+        tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.unsubscribe(queue)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "seq": self.seq,
+            "batches": self.batches,
+            "resyncs": self.resyncs,
+            "window": self.window
+        }
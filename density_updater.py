@@ -0,0 +1,86 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import models
+from crowd_simulation import CrowdSimulator
+from density_ingest import apply_density_updates
+
+class DensityUpdater:
+    """
+    Background task that refreshes the simulated crowd density of every stop.
+    Each cycle computes all densities in one vectorized call and writes them in a
+    single transaction from a dedicated worker thread, using a fresh session, so
+    the event loop never waits on the database.
+    """
+    def __init__(self, simulator: CrowdSimulator, session_factory, interval: float = 300,
+                 on_update: Callable[[Dict[int, float]], None] = None):
+        self.simulator = simulator
+        self.session_factory = session_factory
+        self.interval = interval
+        self.on_update = on_update
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_rows_updated = 0
+        self.last_error: Optional[str] = None
+
+    def run_once(self) -> int:
+        """Run one update cycle synchronously; returns the number of stops updated"""
+        start = time.perf_counter()
+        db = self.session_factory()
+        try:
+            stop_ids = [row[0] for row in db.query(models.BusStop.id)]
+            densities = self.simulator.get_current_densities(stop_ids)
+            updated, _ = apply_density_updates(db, list(zip(stop_ids, densities.tolist())))
+        finally:
+            db.close()
+        if self.on_update is not None:
+            self.on_update(updated)
+
+        self.runs += 1
+        self.last_run_at = datetime.utcnow()
+        self.last_duration = time.perf_counter() - start
+        self.last_rows_updated = len(updated)
+        self.last_error = None
+        return len(updated)
+
+    async def run_forever(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(self.executor, self.run_once)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error updating crowd density: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.task is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="density-updater")
+            self.task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def status(self) -> dict:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "last_duration": self.last_duration,
+            "last_rows_updated": self.last_rows_updated,
+            "last_error": self.last_error
+        }
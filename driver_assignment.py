@@ -0,0 +1,150 @@
+from datetime import datetime
+from typing import List, Tuple
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import models
+import route_stops
+
+# Longest shift a driver may reach with a new route
+MAX_SHIFT_HOURS = 8.0
+# Cost weights, all in "minutes of delay" equivalents
+HOURS_WEIGHT = 10.0         # per hour already worked today
+DISTANCE_WEIGHT = 3.0       # per km between the driver and the route's first stop
+BREAK_PENALTY = 60.0        # route would run into the driver's next scheduled break
+INFEASIBLE = 1e9            # route would push the driver past MAX_SHIFT_HOURS
+EARTH_RADIUS_KM = 6371.0
+
+def next_break_hours(break_slots: list, now: datetime) -> float:
+    """
+    Hours from now until the driver's next break that has not ended yet (0 if on one)
+    Slots are [start, end] pairs or {"start", "end"} dicts of datetimes or ISO strings
+    Returns inf when there is no upcoming break
+    """
+    upcoming = float("inf")
+    for slot in break_slots or []:
+        start, end = (slot["start"], slot["end"]) if isinstance(slot, dict) else slot
+        start = datetime.fromisoformat(start) if isinstance(start, str) else start
+        end = datetime.fromisoformat(end) if isinstance(end, str) else end
+        if end > now:
+            upcoming = min(upcoming, max((start - now).total_seconds() / 3600, 0.0))
+    return upcoming
+
+def hours_worked_today(hours_today: float, updated_at: datetime, now: datetime) -> float:
+    """
+    Hours a driver has worked on now's date
+    hours_today carries over between assignments on the same day and starts again
+    from zero on a driver's first assignment of a new day
+    """
+    if updated_at is None or updated_at.date() < now.date():
+        return 0.0
+    return hours_today or 0.0
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)), axis=1)
+
+def great_circle_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Distances between every point of the first set and every point of the second, as a matrix"""
+    # Chord length from one matrix product of unit vectors, then the arc it subtends
+    chord_squared = 2.0 - 2.0 * (_unit_vectors(lat1, lon1) @ _unit_vectors(lat2, lon2).T)
+    np.clip(chord_squared, 0.0, 4.0, out=chord_squared)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(chord_squared) / 2)
+
+def build_cost_matrix(hours_today: np.ndarray, driver_lat: np.ndarray, driver_lon: np.ndarray,
+                      next_break: np.ndarray, route_hours: np.ndarray, route_lat: np.ndarray,
+                      route_lon: np.ndarray, max_shift_hours: float = MAX_SHIFT_HOURS) -> np.ndarray:
+    """
+    Cost of giving each driver each route, as a (drivers, routes) matrix
+    Args:
+        hours_today: Hours each driver has already worked
+        driver_lat, driver_lon: Where each driver is, NaN if unknown
+        next_break: Hours until each driver's next break (inf if none)
+        route_hours: Duration of each route
+        route_lat, route_lon: First stop of each route
+    Returns:
+        costs; pairs that would exceed max_shift_hours cost INFEASIBLE
+    """
+    hours_today = np.asarray(hours_today, dtype=np.float64)[:, np.newaxis]
+    route_hours = np.asarray(route_hours, dtype=np.float64)[np.newaxis, :]
+
+    distance = great_circle_km(np.asarray(driver_lat, dtype=np.float64), np.asarray(driver_lon, dtype=np.float64),
+                               np.asarray(route_lat, dtype=np.float64), np.asarray(route_lon, dtype=np.float64))
+    # Drivers with an unknown position are charged the average known distance to every route
+    unknown = np.isnan(distance)
+    if unknown.any():
+        distance = np.where(unknown, distance[~unknown].mean() if not unknown.all() else 0.0, distance)
+
+    cost = distance
+    cost *= DISTANCE_WEIGHT
+    cost += HOURS_WEIGHT * hours_today
+    cost += BREAK_PENALTY * (np.asarray(next_break, dtype=np.float64)[:, np.newaxis] < route_hours)
+    cost[hours_today + route_hours > max_shift_hours] = INFEASIBLE
+    return cost
+
+def optimal_assignment(cost: np.ndarray) -> List[Tuple[int, int, float]]:
+    """
+    Minimum total cost matching of drivers (rows) to routes (columns), Hungarian-style
+    Every route gets at most one driver; pairs costing INFEASIBLE are left out
+    Returns:
+        (driver row, route column, cost) for every assignment
+    """
+    if cost.size == 0:
+        return []
+    rows, columns = linear_sum_assignment(cost)
+    keep = cost[rows, columns] < INFEASIBLE
+    return list(zip(rows[keep].tolist(), columns[keep].tolist(), cost[rows, columns][keep].tolist()))
+
+def assign_off_duty_drivers(db: Session, now: datetime = None) -> List[Tuple[int, int, float]]:
+    """
+    Assign off-duty drivers to active routes at minimum total cost in a single transaction
+    Drivers are taken to be at the last stop of their previous route and routes start at
+    their first stop; the chosen drivers become active on their new route and its duration
+    is added to their hours worked today
+    Returns:
+        (driver_id, route_id, cost) for every assignment made
+    """
+    now = now or datetime.now()
+    routes = db.query(models.Route.id, models.Route.estimated_time).filter(models.Route.is_active == True).all()
+    drivers = db.query(models.Driver.id, models.Driver.hours_today, models.Driver.current_route_id,
+                       models.Driver.break_slots, models.Driver.updated_at).filter(
+        models.Driver.status == "off_duty").all()
+    if not routes or not drivers:
+        return []
+    stops = {stop_id: (lat, lon) for stop_id, lat, lon in
+             db.query(models.BusStop.id, models.BusStop.latitude, models.BusStop.longitude)}
+    ends = route_stops.terminals(db)  # route -> (first stop, last stop)
+
+    unknown = (np.nan, np.nan)
+    driver_positions = np.array([stops.get(ends.get(route_id, (None, None))[1], unknown)
+                                 for _, _, route_id, _, _ in drivers], dtype=np.float64)
+    route_starts = np.array([stops.get(ends.get(route_id, (None, None))[0], unknown)
+                             for route_id, _ in routes], dtype=np.float64)
+    hours_today = [hours_worked_today(hours, updated_at, now) for _, hours, _, _, updated_at in drivers]
+    route_hours = [(minutes or 0) / 60 for _, minutes in routes]
+    cost = build_cost_matrix(
+        hours_today=hours_today,
+        driver_lat=driver_positions[:, 0],
+        driver_lon=driver_positions[:, 1],
+        next_break=[next_break_hours(slots, now) for _, _, _, slots, _ in drivers],
+        route_hours=route_hours,
+        route_lat=route_starts[:, 0],
+        route_lon=route_starts[:, 1]
+    )
+    matches = optimal_assignment(cost)
+    if not matches:
+        return []
+
+    try:
+        db.execute(update(models.Driver), [
+            {"id": drivers[row].id, "current_route_id": routes[column].id, "status": "active",
+             "hours_today": hours_today[row] + route_hours[column], "updated_at": now}
+            for row, column, _ in matches
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return [(drivers[row].id, routes[column].id, value) for row, column, value in matches]
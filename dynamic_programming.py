@@ -1,95 +1,327 @@
+import time
 import numpy as np
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, NamedTuple, Optional
 import networkx as nx
 
+# Largest number of stops solved exactly with Held-Karp; bigger problems use the heuristic
+EXACT_TSP_LIMIT = 16
+
+class TSPSolution(NamedTuple):
+    cost: float
+    path: List[int]
+    mode: str  # "exact" (Held-Karp) or "heuristic" (nearest neighbour + 2-opt/Or-opt)
+    elapsed: float  # seconds
+
+def solve_tsp(cost_matrix: np.ndarray, end: Optional[int] = None,
+              exact_limit: int = EXACT_TSP_LIMIT) -> TSPSolution:
+    """
+    Find a minimum cost ordering of all stops, starting from stop 0
+    Args:
+        cost_matrix: Matrix of costs between stops (may be asymmetric)
+        end: Stop the route must finish at; None for a closed tour back to stop 0
+        exact_limit: Largest number of stops solved exactly, larger inputs use the heuristic
+    Returns:
+        TSPSolution with the cost, the stop order (without the return to stop 0),
+        the mode that ran and the time it took
+    """
+    start_time = time.perf_counter()
+    cost_matrix = np.asarray(cost_matrix, dtype=np.float64)
+    n = len(cost_matrix)
+    if end is not None and n > 1 and end == 0:
+        raise ValueError("end must differ from the start stop")
+
+    if n <= 1:
+        path, mode = list(range(n)), "exact"
+    elif n <= exact_limit:
+        path, mode = _held_karp(cost_matrix, end), "exact"
+    else:
+        path, mode = _local_search(cost_matrix, _nearest_neighbour(cost_matrix, end), end), "heuristic"
+
+    return TSPSolution(_route_cost(cost_matrix, path, end), path, mode, time.perf_counter() - start_time)
+
+def _route_cost(cost_matrix: np.ndarray, path: List[int], end: Optional[int]) -> float:
+    if not path:
+        return 0.0
+    order = np.asarray(path + [path[0]] if end is None else path)
+    return float(cost_matrix[order[:-1], order[1:]].sum())
+
+def _held_karp(cost_matrix: np.ndarray, end: Optional[int]) -> List[int]:
+    """
+    Held-Karp over subsets of stops 1..n-1, one vectorized update per (layer, last stop)
+    dp[mask][j] is the cheapest path from stop 0 through the stops in mask ending at stop j + 1
+    """
+    m = len(cost_matrix) - 1
+    inner = cost_matrix[1:, 1:].astype(np.float32)
+    dp = np.full((1 << m, m), np.inf, dtype=np.float32)
+    parent = np.full((1 << m, m), -1, dtype=np.int8 if m < 127 else np.int16)
+
+    # Base case: go straight from stop 0 to stop j
+    singles = 1 << np.arange(m)
+    dp[singles, np.arange(m)] = cost_matrix[0, 1:]
+
+    masks = np.arange(1 << m)
+    popcount = np.zeros(1 << m, dtype=np.int8)
+    for bit in range(m):
+        popcount += (masks >> bit) & 1
+
+    for size in range(2, m + 1):
+        layer = masks[popcount == size]
+        for j in range(m):
+            with_j = layer[(layer >> j) & 1 == 1]
+            candidates = dp[with_j ^ (1 << j)] + inner[:, j]
+            best = candidates.argmin(axis=1)
+            dp[with_j, j] = candidates[np.arange(len(with_j)), best]
+            parent[with_j, j] = best
+
+    full = (1 << m) - 1
+    if end is None:
+        last = int(np.argmin(dp[full] + cost_matrix[1:, 0]))
+    else:
+        last = end - 1
+
+    # Reconstruct the path
+    path = []
+    mask = full
+    current = last
+    while mask:
+        path.append(current + 1)
+        previous = int(parent[mask, current])
+        mask ^= 1 << current
+        current = previous
+    path.append(0)
+    return path[::-1]
+
+def _nearest_neighbour(cost_matrix: np.ndarray, end: Optional[int]) -> List[int]:
+    n = len(cost_matrix)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    if end is not None:
+        visited[end] = True
+    path = [0]
+    for _ in range(n - visited.sum()):
+        costs = np.where(visited, np.inf, cost_matrix[path[-1]])
+        nxt = int(costs.argmin())
+        visited[nxt] = True
+        path.append(nxt)
+    if end is not None:
+        path.append(end)
+    return path
+
+def _local_search(cost_matrix: np.ndarray, path: List[int], end: Optional[int],
+                  max_moves: int = 100000) -> List[int]:
+    """Apply the best improving 2-opt or Or-opt move until none is left"""
+    # Work on a sequence whose first and last entries stay fixed
+    seq = np.array(path + [0] if end is None else path)
+    for _ in range(max_moves):
+        improved = _two_opt_move(cost_matrix, seq)
+        if improved is None:
+            improved = _or_opt_move(cost_matrix, seq)
+        if improved is None:
+            break
+        seq = improved
+    result = seq.tolist()
+    return result[:-1] if end is None else result
+
+def _two_opt_move(cost_matrix: np.ndarray, seq: np.ndarray) -> Optional[np.ndarray]:
+    """Best segment reversal seq[i..j]; handles asymmetric costs via prefix sums"""
+    length = len(seq)
+    if length < 4:
+        return None
+    forward = np.concatenate(([0.0], np.cumsum(cost_matrix[seq[:-1], seq[1:]])))
+    backward = np.concatenate(([0.0], np.cumsum(cost_matrix[seq[1:], seq[:-1]])))
+    i = np.arange(1, length - 1)[:, np.newaxis]
+    j = np.arange(1, length - 1)[np.newaxis, :]
+    old = cost_matrix[seq[i - 1], seq[i]] + (forward[j] - forward[i]) + cost_matrix[seq[j], seq[j + 1]]
+    new = cost_matrix[seq[i - 1], seq[j]] + (backward[j] - backward[i]) + cost_matrix[seq[i], seq[j + 1]]
+    delta = np.where(j > i, new - old, np.inf)
+    best = np.unravel_index(delta.argmin(), delta.shape)
+    if delta[best] >= -1e-9:
+        return None
+    a, b = best[0] + 1, best[1] + 1
+    result = seq.copy()
+    result[a:b + 1] = seq[a:b + 1][::-1]
+    return result
+
+def _or_opt_move(cost_matrix: np.ndarray, seq: np.ndarray) -> Optional[np.ndarray]:
+    """Best relocation of a run of 1-3 stops to another edge, keeping its direction"""
+    length = len(seq)
+    best_delta, best_move = -1e-9, None
+    p = np.arange(length - 1)[np.newaxis, :]
+    edge_cost = cost_matrix[seq[:-1], seq[1:]]
+    for run in range(1, 4):
+        if length - 2 < run + 1:
+            break
+        i = np.arange(1, length - run)[:, np.newaxis]
+        first, last = seq[i], seq[i + run - 1]
+        removed = (cost_matrix[seq[i - 1], first] + cost_matrix[last, seq[i + run]]
+                   - cost_matrix[seq[i - 1], seq[i + run]])
+        inserted = cost_matrix[seq[p], first] + cost_matrix[last, seq[p + 1]] - edge_cost[p]
+        delta = inserted - removed
+        delta = np.where((p >= i - 1) & (p <= i + run - 1), np.inf, delta)
+        idx = np.unravel_index(delta.argmin(), delta.shape)
+        if delta[idx] < best_delta:
+            best_delta, best_move = delta[idx], (idx[0] + 1, run, idx[1])
+    if best_move is None:
+        return None
+    start, run, after = best_move
+    segment = seq[start:start + run]
+    rest = np.concatenate((seq[:start], seq[start + run:]))
+    position = after + 1 if after < start else after + 1 - run
+    return np.concatenate((rest[:position], segment, rest[position:]))
+
+def _capacity_held_karp(cost_matrix: np.ndarray, demands: np.ndarray, capacity: float,
+                        upper_bound: float = np.inf) -> List[int]:
+    """
+    Held-Karp restricted to states whose load stays within [0, capacity]
+    The load of a state is the total demand of the stops in its mask, so the capacity
+    dimension is implicit. Layers are grown from the previous layer's masks, only the
+    current and previous dp layers are kept, and states costing more than upper_bound
+    are dropped because they cannot lead to a better tour.
+    Returns the stop order starting at stop 0, or [] when no feasible order exists
+    """
+    m = len(cost_matrix) - 1
+    inner = cost_matrix[1:, 1:].astype(np.float32)
+    load_step = demands[1:]
+    eps = 1e-9
+    parent_dtype = np.int8 if m < 127 else np.int16
+
+    # First layer: go straight from stop 0 to stop j
+    masks = np.array([1 << j for j in range(m) if 0 <= load_step[j] <= capacity + eps], dtype=np.int64)
+    loads = np.array([load_step[j] for j in range(m) if 0 <= load_step[j] <= capacity + eps])
+    dp = np.full((len(masks), m), np.inf, dtype=np.float32)
+    for row, mask in enumerate(masks):
+        j = int(mask).bit_length() - 1
+        dp[row, j] = cost_matrix[0, j + 1]
+    layers = [(masks, np.full((len(masks), m), -1, dtype=parent_dtype))]
+
+    for _ in range(1, m):
+        if len(masks) == 0:
+            return []
+        # Every feasible extension of the previous layer by one stop
+        grown, grown_loads = [], []
+        for j in range(m):
+            free = (masks >> j) & 1 == 0
+            new_loads = loads[free] + load_step[j]
+            ok = (new_loads >= -eps) & (new_loads <= capacity + eps)
+            grown.append(masks[free][ok] | (1 << j))
+            grown_loads.append(new_loads[ok])
+        next_masks, first = np.unique(np.concatenate(grown), return_index=True)
+        next_loads = np.concatenate(grown_loads)[first]
+        next_dp = np.full((len(next_masks), m), np.inf, dtype=np.float32)
+        next_parent = np.full((len(next_masks), m), -1, dtype=parent_dtype)
+
+        for j in range(m):
+            rows = np.nonzero((next_masks >> j) & 1)[0]
+            prev_masks = next_masks[rows] ^ (1 << j)
+            prev_rows = np.searchsorted(masks, prev_masks)
+            prev_rows = np.minimum(prev_rows, len(masks) - 1)
+            found = masks[prev_rows] == prev_masks
+            rows, prev_rows = rows[found], prev_rows[found]
+            candidates = dp[prev_rows] + inner[:, j]
+            best = candidates.argmin(axis=1)
+            next_dp[rows, j] = candidates[np.arange(len(rows)), best]
+            next_parent[rows, j] = best
+
+        # Drop dominated states and masks with no state left
+        next_dp[next_dp > upper_bound * (1 + 1e-5) + eps] = np.inf
+        alive = np.isfinite(next_dp).any(axis=1)
+        masks, loads = next_masks[alive], next_loads[alive]
+        dp, next_parent = next_dp[alive], next_parent[alive]
+        layers.append((masks, next_parent))
+
+    full = (1 << m) - 1
+    if len(masks) == 0 or masks[-1] != full:
+        return []
+    final = dp[-1] + cost_matrix[1:, 0]
+    if not np.isfinite(final).any():
+        return []
+
+    # Reconstruct the path layer by layer
+    path = []
+    mask = full
+    current = int(np.argmin(final))
+    for layer_masks, layer_parent in reversed(layers):
+        row = int(np.searchsorted(layer_masks, mask))
+        path.append(current + 1)
+        previous = int(layer_parent[row, current])
+        mask ^= 1 << current
+        current = previous
+    path.append(0)
+    return path[::-1]
+
 class RouteOptimizer:
     def __init__(self, graph: nx.Graph):
         self.graph = graph
+        self.last_solution: Optional[TSPSolution] = None
         
     def floyd_warshall(self) -> Tuple[np.ndarray, np.ndarray]:
         """
         Implements Floyd-Warshall algorithm for finding shortest paths between all pairs of nodes
+        Rows and columns follow the order of self.graph.nodes; use node_index to map labels
         Returns:
             - distance matrix
-            - predecessor matrix for path reconstruction
+            - predecessor matrix for path reconstruction (next hop towards the target)
         """
-        n = len(self.graph.nodes)
+        self.nodes = list(self.graph.nodes)
+        n = len(self.nodes)
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
         dist = np.full((n, n), np.inf)
-        pred = np.full((n, n), -1)
+        pred = np.full((n, n), -1, dtype=np.int64)
         
-        # Initialize distance matrix with direct edges
+        # Initialize distance matrix with direct edges, keeping the cheapest parallel edge
+        directed = self.graph.is_directed()
         for u, v, data in self.graph.edges(data=True):
-            dist[u-1][v-1] = data['weight']
-            pred[u-1][v-1] = v-1
+            i, j = self.node_index[u], self.node_index[v]
+            weight = data['weight']
+            if weight < dist[i, j]:
+                dist[i, j] = weight
+                pred[i, j] = j
+            if not directed and weight < dist[j, i]:
+                dist[j, i] = weight
+                pred[j, i] = i
             
         # Set diagonal to 0
-        for i in range(n):
-            dist[i][i] = 0
+        np.fill_diagonal(dist, 0)
+        pred[np.arange(n), np.arange(n)] = np.arange(n)
             
-        # Floyd-Warshall algorithm
+        # Floyd-Warshall algorithm: one broadcasted min-update per intermediate node
         for k in range(n):
-            for i in range(n):
-                for j in range(n):
-                    if dist[i][k] + dist[k][j] < dist[i][j]:
-                        dist[i][j] = dist[i][k] + dist[k][j]
-                        pred[i][j] = pred[i][k]
+            through_k = dist[:, k, np.newaxis] + dist[np.newaxis, k, :]
+            improved = through_k < dist
+            np.copyto(dist, through_k, where=improved)
+            np.copyto(pred, np.broadcast_to(pred[:, k, np.newaxis], (n, n)), where=improved)
                         
         return dist, pred
+
+    def reconstruct_path(self, pred: np.ndarray, start, end) -> List:
+        """
+        Rebuild the node labels on the shortest path from start to end
+        using the predecessor matrix returned by floyd_warshall
+        """
+        i, j = self.node_index[start], self.node_index[end]
+        if pred[i, j] == -1:
+            return []
+        path = [start]
+        while i != j:
+            i = pred[i, j]
+            path.append(self.nodes[i])
+        return path
     
-    def traveling_salesman_dp(self, cost_matrix: np.ndarray) -> Tuple[float, List[int]]:
+    def traveling_salesman_dp(self, cost_matrix: np.ndarray,
+                              exact_limit: int = EXACT_TSP_LIMIT) -> Tuple[float, List[int]]:
         """
         Solves the Traveling Salesman Problem using dynamic programming
+        Inputs larger than exact_limit stops fall back to nearest neighbour + 2-opt/Or-opt;
+        the mode used and the solve time are kept in self.last_solution
         Args:
             cost_matrix: Matrix of costs between stops
+            exact_limit: Largest number of stops solved exactly
         Returns:
             - minimum cost
             - optimal route
         """
-        n = len(cost_matrix)
-        # dp[mask][pos] represents the minimum cost to visit all nodes in mask
-        # starting from pos and ending at the first node
-        dp = np.full((1 << n, n), np.inf)
-        parent = np.full((1 << n, n), -1)
-        
-        # Base case: start from node 0
-        dp[1][0] = 0
-        
-        # Dynamic Programming
-        for mask in range(1 << n):
-            for pos in range(n):
-                if not (mask & (1 << pos)):
-                    continue
-                for next_pos in range(n):
-                    if mask & (1 << next_pos):
-                        continue
-                    new_mask = mask | (1 << next_pos)
-                    if dp[new_mask][next_pos] > dp[mask][pos] + cost_matrix[pos][next_pos]:
-                        dp[new_mask][next_pos] = dp[mask][pos] + cost_matrix[pos][next_pos]
-                        parent[new_mask][next_pos] = pos
-        
-        # Find the minimum cost to return to start
-        final_mask = (1 << n) - 1
-        min_cost = float('inf')
-        last_pos = -1
-        
-        for pos in range(n):
-            cost = dp[final_mask][pos] + cost_matrix[pos][0]
-            if cost < min_cost:
-                min_cost = cost
-                last_pos = pos
-        
-        # Reconstruct the path
-        path = []
-        mask = final_mask
-        current = last_pos
-        
-        while current != -1:
-            path.append(current)
-            new_current = parent[mask][current]
-            mask ^= (1 << current)
-            current = new_current
-            
-        return min_cost, path[::-1]
+        self.last_solution = solve_tsp(cost_matrix, exact_limit=exact_limit)
+        return self.last_solution.cost, self.last_solution.path
     
     def optimize_route_with_constraints(self, 
                                      cost_matrix: np.ndarray,
@@ -97,65 +329,30 @@ class RouteOptimizer:
                                      capacity: float) -> List[int]:
         """
         Optimizes route considering vehicle capacity and stop demands
+        Only states whose load stays within the capacity are stored, so memory does not
+        grow with the capacity; negative demands model passengers leaving the bus
         Args:
             cost_matrix: Matrix of costs between stops
             demands: List of demands at each stop
             capacity: Vehicle capacity
         Returns:
-            - Optimized route
+            - Optimized route, or an empty list if no order respects the capacity
         """
+        start_time = time.perf_counter()
+        cost_matrix = np.asarray(cost_matrix, dtype=np.float64)
+        demands = np.asarray(demands, dtype=np.float64)
         n = len(cost_matrix)
-        # dp[mask][pos][load] represents the minimum cost to visit all nodes in mask
-        # starting from pos with current load
-        dp = np.full((1 << n, n, int(capacity) + 1), np.inf)
-        parent = np.full((1 << n, n, int(capacity) + 1), -1)
-        
-        # Base case: start from node 0 with empty load
-        dp[1][0][0] = 0
-        
-        # Dynamic Programming
-        for mask in range(1 << n):
-            for pos in range(n):
-                if not (mask & (1 << pos)):
-                    continue
-                for load in range(int(capacity) + 1):
-                    if dp[mask][pos][load] == np.inf:
-                        continue
-                    for next_pos in range(n):
-                        if mask & (1 << next_pos):
-                            continue
-                        new_load = load + int(demands[next_pos])
-                        if new_load <= capacity:
-                            new_mask = mask | (1 << next_pos)
-                            if dp[new_mask][next_pos][new_load] > dp[mask][pos][load] + cost_matrix[pos][next_pos]:
-                                dp[new_mask][next_pos][new_load] = dp[mask][pos][load] + cost_matrix[pos][next_pos]
-                                parent[new_mask][next_pos][new_load] = pos
-        
-        # Find the best solution
-        final_mask = (1 << n) - 1
-        min_cost = float('inf')
-        best_load = -1
-        last_pos = -1
-        
-        for load in range(int(capacity) + 1):
-            for pos in range(n):
-                cost = dp[final_mask][pos][load] + cost_matrix[pos][0]
-                if cost < min_cost:
-                    min_cost = cost
-                    best_load = load
-                    last_pos = pos
-        
-        # Reconstruct the path
-        path = []
-        mask = final_mask
-        current = last_pos
-        load = best_load
-        
-        while current != -1:
-            path.append(current)
-            new_current = parent[mask][current][load]
-            mask ^= (1 << current)
-            load -= int(demands[current])
-            current = new_current
-            
-        return path[::-1] 
\ No newline at end of file
+        if n <= 1:
+            return list(range(n))
+
+        # With pickups only, any full ordering is feasible and bounds the optimum
+        upper_bound = np.inf
+        if (demands[1:] >= 0).all() and (cost_matrix >= 0).all():
+            if demands[1:].sum() > capacity:
+                return []
+            upper_bound = solve_tsp(cost_matrix, exact_limit=0).cost
+
+        path = _capacity_held_karp(cost_matrix, demands, capacity, upper_bound)
+        self.last_solution = TSPSolution(_route_cost(cost_matrix, path, None), path, "exact",
+                                         time.perf_counter() - start_time)
+        return path
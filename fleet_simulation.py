@@ -0,0 +1,182 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import List, Dict, NamedTuple, Optional
+import numpy as np
+
+from crowd_simulation import CrowdSimulator, Driver
+
+# Event kinds in SimulationResult.kind
+ARRIVAL = 0  # a bus served a stop
+BREAK = 1    # the driver went on break and the bus was held at the stop
+
+class Trip(NamedTuple):
+    route_id: int
+    start: datetime
+    capacity: int = 50
+    driver: Optional[Driver] = None
+
+class SimulationResult:
+    """
+    Events of a simulation run as parallel NumPy arrays, one entry per event in time order
+    Attributes:
+        time: Minutes since the start of the day (float32)
+        kind: ARRIVAL or BREAK (int8)
+        trip: Index of the trip in the list passed to run() (int32)
+        stop: Stop id (int64, wide enough for OSM node ids)
+        boarded, alighted: Passengers getting on and off (int16)
+        load: Passengers on board when the bus leaves (int16)
+        left_behind: Passengers still waiting at the stop when the bus leaves (int32)
+    """
+    def __init__(self, events: Dict[str, np.ndarray], generated: int, late_minutes: np.ndarray):
+        self.time = events["time"]
+        self.kind = events["kind"]
+        self.trip = events["trip"]
+        self.stop = events["stop"]
+        self.boarded = events["boarded"]
+        self.alighted = events["alighted"]
+        self.load = events["load"]
+        self.left_behind = events["left_behind"]
+        self.generated = generated
+        self.late_minutes = late_minutes  # per trip, last stop arrival versus timetable; NaN if unfinished
+
+    def __len__(self):
+        return len(self.time)
+
+    def summary(self) -> dict:
+        arrivals = self.kind == ARRIVAL
+        boarded = int(self.boarded.sum())
+        finished = self.late_minutes[~np.isnan(self.late_minutes)]
+        return {
+            "events": len(self),
+            "passengers_generated": self.generated,
+            "passengers_boarded": boarded,
+            "passengers_not_served": self.generated - boarded,
+            "full_bus_stops": int((arrivals & (self.left_behind > 0)).sum()),
+            "peak_load": int(self.load.max()) if len(self) else 0,
+            "breaks": int((self.kind == BREAK).sum()),
+            "trips_finished": len(finished),
+            "mean_late_minutes": float(finished.mean()) if len(finished) else 0.0
+        }
+
+class FleetSimulation:
+    """
+    Discrete-event simulation of buses running trips along their routes over a day.
+    Passengers arrive at every stop as Poisson counts drawn per minute from the
+    CrowdSimulator densities, all at once. Buses move from stop to stop through a heap-based
+    event queue: riders alight (destinations uniform over the remaining stops), waiting
+    passengers board up to the bus capacity and dwell time grows with the passengers
+    served. When a driver's break falls before the next stop, the bus is held until it ends.
+    """
+    def __init__(self, routes: Dict[int, List[int]], route_minutes: Dict[int, float],
+                 simulator: CrowdSimulator = None, seed: int = None, arrival_rate: float = 0.01,
+                 dwell_seconds: float = 15.0, board_seconds: float = 3.0):
+        """
+        Args:
+            routes: Route id -> ordered stop ids
+            route_minutes: Route id -> end to end running time, spread evenly over the hops
+            arrival_rate: Passengers per minute per unit of crowd density
+        """
+        self.simulator = simulator or CrowdSimulator(seed=seed)
+        self.rng = np.random.default_rng(seed)
+        self.arrival_rate = arrival_rate
+        self.dwell_seconds = dwell_seconds
+        self.board_seconds = board_seconds
+
+        self.stop_ids = np.array(sorted({stop_id for stops in routes.values() for stop_id in stops}), dtype=np.int64)
+        columns = {int(stop_id): column for column, stop_id in enumerate(self.stop_ids)}
+        self.route_columns = {route_id: [columns[stop_id] for stop_id in stops] for route_id, stops in routes.items()}
+        self.hop_minutes = {route_id: (route_minutes.get(route_id) or 0) / max(len(stops) - 1, 1)
+                            for route_id, stops in routes.items()}
+
+    def generate_arrivals(self, day_start: datetime, minutes: int) -> np.ndarray:
+        """
+        Cumulative passenger arrivals at every stop
+        Returns:
+            int32 matrix of shape (minutes + 1, stops); row m counts the passengers that
+            arrived before minute m
+        """
+        arrivals = np.zeros((minutes + 1, len(self.stop_ids)), dtype=np.int32)
+        row = 1
+        for _, densities in self.simulator.stream_densities(self.stop_ids, day_start,
+                                                            day_start + timedelta(minutes=minutes),
+                                                            step=timedelta(minutes=1)):
+            arrivals[row:row + len(densities)] = self.rng.poisson(densities * self.arrival_rate)
+            row += len(densities)
+        np.cumsum(arrivals, axis=0, out=arrivals)
+        return arrivals
+
+    def run(self, trips: List[Trip], day_start: datetime, hours: float = 24) -> SimulationResult:
+        """
+        Simulate the trips from day_start for the given number of hours
+        Raises ValueError if a trip starts before day_start
+        """
+        early = [idx for idx, trip in enumerate(trips) if trip.start < day_start]
+        if early:
+            raise ValueError(f"{len(early)} trips start before day_start, first is trip {early[0]}")
+        minutes = int(hours * 60)
+        arrivals = self.generate_arrivals(day_start, minutes)
+        served = [0] * len(self.stop_ids)  # passengers that have left each stop's queue
+
+        columns = [self.route_columns[trip.route_id] for trip in trips]
+        hops = [self.hop_minutes[trip.route_id] for trip in trips]
+        departures = [(trip.start - day_start).total_seconds() / 60 for trip in trips]
+        position = [0] * len(trips)
+        load = [0] * len(trips)
+        late = np.full(len(trips), np.nan, dtype=np.float32)  # stays NaN for trips cut off by the horizon
+        # Uniforms for stochastic rounding of alightings, one per stop visit
+        uniforms = self.rng.random(sum(len(stops) for stops in columns)).tolist()
+
+        events = {name: [] for name in ("time", "kind", "trip", "stop", "boarded", "alighted", "load", "left_behind")}
+        time_, kind, trip_, stop_, boarded_, alighted_, load_, left_ = events.values()
+        stop_ids = self.stop_ids.tolist()
+
+        queue = [(departure, idx) for idx, departure in enumerate(departures) if columns[idx]]
+        heapq.heapify(queue)
+        visit = 0
+        while queue:
+            now, idx = heapq.heappop(queue)
+            if now >= minutes:
+                continue
+            stops = columns[idx]
+            pos = position[idx]
+            column = stops[pos]
+
+            # Riders are spread evenly over the stops still ahead, this one included
+            onboard = load[idx]
+            alighting = int(onboard / (len(stops) - pos) + uniforms[visit])
+            visit += 1
+            onboard -= alighting
+            waiting = int(arrivals[int(now), column]) - served[column]
+            terminus = pos == len(stops) - 1
+            # Nobody boards at the terminus, and those waiting there are not left behind by this bus
+            boarding = 0 if terminus else min(waiting, trips[idx].capacity - onboard)
+            served[column] += boarding
+            onboard += boarding
+            load[idx] = onboard
+
+            time_.append(now); kind.append(ARRIVAL); trip_.append(idx); stop_.append(stop_ids[column])
+            boarded_.append(boarding); alighted_.append(alighting); load_.append(onboard)
+            left_.append(0 if terminus else waiting - boarding)
+
+            if terminus:
+                late[idx] = now - (departures[idx] + hops[idx] * pos)
+                continue
+
+            depart = now + (self.dwell_seconds + self.board_seconds * (boarding + alighting)) / 60
+            arrive = depart + hops[idx]
+            driver = trips[idx].driver
+            if driver is not None and driver.break_slots:
+                break_end = driver.break_clash_end(day_start + timedelta(minutes=depart),
+                                                   day_start + timedelta(minutes=arrive))
+                if break_end is not None:
+                    time_.append(depart); kind.append(BREAK); trip_.append(idx); stop_.append(stop_ids[column])
+                    boarded_.append(0); alighted_.append(0); load_.append(onboard); left_.append(0)
+                    arrive = max(depart, (break_end - day_start).total_seconds() / 60) + hops[idx]
+
+            position[idx] = pos + 1
+            heapq.heappush(queue, (arrive, idx))
+
+        dtypes = {"time": np.float32, "kind": np.int8, "trip": np.int32, "stop": np.int64,
+                  "boarded": np.int16, "alighted": np.int16, "load": np.int16, "left_behind": np.int32}
+        return SimulationResult({name: np.array(values, dtype=dtypes[name]) for name, values in events.items()},
+                                generated=int(arrivals[-1].sum()), late_minutes=late)
@@ -11,12 +11,15 @@ import {
 } from '@mui/material';
 import { People as PeopleIcon } from '@mui/icons-material';
 import axios from 'axios';
+import { useDensityStream } from '../densityStream';
 
 const CrowdSimulator = () => {
   const [stops, setStops] = useState([]);
   const [simulationActive, setSimulationActive] = useState(false);
   const [baseDensity, setBaseDensity] = useState(100);
   const [timeMultiplier, setTimeMultiplier] = useState(1);
+  const densities = useDensityStream();
+  const densityOf = (stop) => densities[stop.id] ?? stop.current_density;
 
   useEffect(() => {
     const fetchStops = async () => {
@@ -36,17 +39,11 @@ const CrowdSimulator = () => {
     if (simulationActive) {
       interval = setInterval(async () => {
         try {
-          // Update density for each stop
-          for (const stop of stops) {
-            const newDensity = calculateNewDensity(stop.current_density);
-            await axios.post('http://localhost:8000/update-density', {
-              stop_id: stop.id,
-              new_density: newDensity,
-            });
-          }
-          // Refresh stops data
-          const response = await axios.get('http://localhost:8000/stops');
-          setStops(response.data);
+          // Update the density of every stop in one request; the new values come back over the stream
+          await axios.post('http://localhost:8000/update-density/bulk', stops.map((stop) => ({
+            stop_id: stop.id,
+            new_density: calculateNewDensity(densityOf(stop)),
+          })));
         } catch (error) {
           console.error('Error updating densities:', error);
         }
@@ -196,13 +193,13 @@ const CrowdSimulator = () => {
                     <Box
                       sx={{
                         height: 20,
-                        bgcolor: getDensityColor(stop.current_density),
+                        bgcolor: getDensityColor(densityOf(stop)),
                         borderRadius: 1,
                         mt: 1,
                       }}
                     />
                     <Typography variant="body2" sx={{ mt: 1 }}>
-                      Density: {stop.current_density.toFixed(0)}
+                      Density: {densityOf(stop).toFixed(0)}
                     </Typography>
                   </CardContent>
                 </Card>
@@ -23,6 +23,7 @@ import 'leaflet/dist/leaflet.css';
 import L from 'leaflet';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
+import { useDensityStream } from '../densityStream';
 
 // Fix for default marker icons in React-Leaflet
 delete L.Icon.Default.prototype._getIconUrl;
@@ -36,24 +37,33 @@ const Dashboard = () => {
   const [stops, setStops] = useState([]);
   const [drivers, setDrivers] = useState([]);
   const [routes, setRoutes] = useState([]);
-  const [totalDensity, setTotalDensity] = useState(0);
+  const densities = useDensityStream();
   const navigate = useNavigate();
 
+  useEffect(() => {
+    const fetchStops = async () => {
+      try {
+        const response = await axios.get('http://localhost:8000/stops');
+        setStops(response.data);
+      } catch (error) {
+        console.error('Error fetching stops:', error);
+      }
+    };
+
+    // Densities arrive over the stream, so stops are only loaded once
+    fetchStops();
+  }, []);
+
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const [stopsRes, driversRes, routesRes] = await Promise.all([
-          axios.get('http://localhost:8000/stops'),
+        const [driversRes, routesRes] = await Promise.all([
           axios.get('http://localhost:8000/drivers'),
           axios.get('http://localhost:8000/routes')
         ]);
         
-        setStops(stopsRes.data);
         setDrivers(driversRes.data);
         setRoutes(routesRes.data);
-        
-        const density = stopsRes.data.reduce((sum, stop) => sum + stop.current_density, 0);
-        setTotalDensity(density);
       } catch (error) {
         console.error('Error fetching data:', error);
       }
@@ -64,6 +74,9 @@ const Dashboard = () => {
     return () => clearInterval(interval);
   }, []);
 
+  const densityOf = (stop) => densities[stop.id] ?? stop.current_density;
+  const totalDensity = stops.reduce((sum, stop) => sum + densityOf(stop), 0);
+
   const getRouteColor = (routeId) => {
     const colors = ['#FF0000', '#00FF00', '#0000FF', '#FFFF00', '#FF00FF', 
                    '#00FFFF', '#FFA500', '#800080', '#008000', '#800000'];
@@ -153,7 +166,7 @@ const Dashboard = () => {
                   <Popup>
                     <Typography variant="subtitle1">{stop.name}</Typography>
                     <Typography variant="body2">
-                      Crowd Density: {stop.current_density.toFixed(0)}
+                      Crowd Density: {densityOf(stop).toFixed(0)}
                     </Typography>
                   </Popup>
                 </Marker>
@@ -191,15 +204,15 @@ const Dashboard = () => {
                   <ListItem key={stop.id}>
                     <ListItemText
                       primary={stop.name}
-                      secondary={`Density: ${stop.current_density.toFixed(0)}`}
+                      secondary={`Density: ${densityOf(stop).toFixed(0)}`}
                     />
                     <Box
                       sx={{
                         width: 20,
                         height: 20,
                         borderRadius: '50%',
-                        backgroundColor: stop.current_density > 150 ? '#ff4444' :
-                                       stop.current_density > 100 ? '#ffbb33' : '#00C851'
+                        backgroundColor: densityOf(stop) > 150 ? '#ff4444' :
+                                       densityOf(stop) > 100 ? '#ffbb33' : '#00C851'
                       }}
                     />
                   </ListItem>
@@ -0,0 +1,24 @@
+import { useEffect, useState } from 'react';
+
+const DENSITY_STREAM_URL = 'http://localhost:8000/density/stream';
+
+// Live crowd density of every stop, as a { stopId: density } map.
+// The server sends a snapshot of all stops on connect, then only the stops that changed;
+// EventSource reconnects on its own and the new snapshot replaces the old state.
+export const useDensityStream = () => {
+  const [densities, setDensities] = useState({});
+
+  useEffect(() => {
+    const source = new EventSource(DENSITY_STREAM_URL);
+    source.addEventListener('snapshot', (event) => {
+      setDensities(JSON.parse(event.data).densities);
+    });
+    source.addEventListener('delta', (event) => {
+      const changes = JSON.parse(event.data).densities;
+      setDensities((current) => ({ ...current, ...changes }));
+    });
+    return () => source.close();
+  }, []);
+
+  return densities;
+};
@@ -0,0 +1,129 @@
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from datetime import datetime
+from typing import List, Tuple, Dict, Optional, Iterable
+from geopy.geocoders import Nominatim
+
+Coordinates = Tuple[float, float]
+
+def normalize_address(address: str) -> str:
+    """
+    Cache key for an address: Unicode-normalized, lower case, with
+    punctuation and whitespace collapsed, so trivial spelling variants share an entry
+    """
+    key = unicodedata.normalize("NFKC", address).casefold()
+    key = re.sub(r"[^\w,]+", " ", key)
+    key = re.sub(r"\s*,\s*", ", ", key)
+    key = re.sub(r"\s+", " ", key)
+    return key.strip(" ,")
+
+class GeocodeCache:
+    """
+    Persistent address -> coordinates cache stored in SQLite
+    Addresses the backend could not resolve are stored too, so they are not re-queried
+    """
+    def __init__(self, path: str = "geocode_cache.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                "key TEXT PRIMARY KEY, latitude REAL, longitude REAL, updated_at TEXT)"
+            )
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Optional[Coordinates]]:
+        """Cached entries for the given keys; keys that were never looked up are absent"""
+        keys = list(keys)
+        found = {}
+        with self.lock:
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, latitude, longitude FROM geocode WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, lat, lon in rows:
+                    found[key] = (lat, lon) if lat is not None else None
+        return found
+
+    def put_many(self, entries: Dict[str, Optional[Coordinates]]):
+        now = datetime.utcnow().isoformat()
+        rows = [(key, *(coords if coords else (None, None)), now) for key, coords in entries.items()]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO geocode (key, latitude, longitude, updated_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def close(self):
+        self.conn.close()
+
+class NominatimBackend:
+    """Online backend using OpenStreetMap Nominatim, throttled to its usage policy"""
+    def __init__(self, user_agent: str = "bus_routing_system", min_delay_seconds: float = 1.0):
+        self.geocoder = Nominatim(user_agent=user_agent)
+        self.min_delay_seconds = min_delay_seconds
+        self._last_call = 0.0
+
+    def geocode(self, address: str) -> Optional[Coordinates]:
+        wait = self.min_delay_seconds - (time.monotonic() - self._last_call)
+        if wait > 0:
+            time.sleep(wait)
+        self._last_call = time.monotonic()
+        location = self.geocoder.geocode(address)
+        if location:
+            return (location.latitude, location.longitude)
+        return None
+
+class StaticBackend:
+    """
+    Local stand-in backend answering from a fixed address table
+    Works offline; records every query so tests can assert which addresses missed the cache
+    """
+    def __init__(self, addresses: Dict[str, Coordinates] = None):
+        self.addresses = {normalize_address(address): coords for address, coords in (addresses or {}).items()}
+        self.queries: List[str] = []
+
+    def geocode(self, address: str) -> Optional[Coordinates]:
+        self.queries.append(address)
+        return self.addresses.get(normalize_address(address))
+
+class BatchGeocoder:
+    """
+    Geocoder that answers from the persistent cache first and only sends
+    misses to the backend. With no backend it works fully offline.
+    """
+    def __init__(self, backend=None, cache: GeocodeCache = None):
+        self.backend = backend
+        self.cache = cache if cache is not None else GeocodeCache()
+
+    def geocode(self, address: str) -> Optional[Coordinates]:
+        return self.geocode_many([address])[0]
+
+    def geocode_many(self, addresses: List[str]) -> List[Optional[Coordinates]]:
+        """
+        Geocode many addresses
+        Returns:
+            (latitude, longitude) for every address, or None where it could not be resolved
+        """
+        keys = [normalize_address(address) for address in addresses]
+        results = self.cache.get_many(set(keys))
+
+        if self.backend is not None:
+            misses = {}
+            try:
+                for address, key in zip(addresses, keys):
+                    if key not in results and key not in misses:
+                        misses[key] = self.backend.geocode(address)
+            finally:
+                # Keep whatever was resolved even if the backend fails part way
+                if misses:
+                    self.cache.put_many(misses)
+                    results.update(misses)
+
+        return [results.get(key) for key in keys]
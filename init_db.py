@@ -2,10 +2,12 @@ import sqlite3
 from sqlalchemy.orm import Session
 from database import engine, SessionLocal
 import models
+import route_stops
 from datetime import datetime
 
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
+route_stops.ensure_schema(engine)
 
 # Sample data
 bus_stops = [
@@ -160,6 +162,7 @@ def init_db():
             db.add(bus)
         
         # Add routes
+        db_routes = []
         for route_data in routes:
             route = models.Route(
                 name=route_data["name"],
@@ -171,6 +174,10 @@ def init_db():
                 updated_at=datetime.now()
             )
             db.add(route)
+            db_routes.append(route)
+        db.flush()
+        for route in db_routes:
+            route_stops.sync_route(db, route)
         
         db.commit()
         print("Database initialized successfully!")
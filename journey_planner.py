@@ -0,0 +1,239 @@
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Tuple
+import numpy as np
+
+from network_index import NetworkIndex
+
+# Integer cost units per minute; integer costs keep the segmented scans below exact
+COST_SCALE = 1000
+# Segment offset used to turn a running minimum into a per-pattern running minimum
+SEGMENT_OFFSET = 1 << 40
+# Boarding value of stops that were not reached in the previous round
+NO_BOARDING = 1 << 39
+UNREACHED = np.iinfo(np.int64).max
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, end) for every pair, without a Python loop"""
+    lengths = ends - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets + np.arange(lengths.sum())
+
+class PlannerTables:
+    """
+    Pattern tables of one topology version of a NetworkIndex; never modified once built.
+    Every route is expanded into two patterns (one per direction) and all patterns are
+    laid out back to back in flat arrays (the route -> stop position table), with a
+    stop -> patterns table next to them.
+    """
+    def __init__(self, index: NetworkIndex):
+        routes = index.routes
+        stop_ids = set(index.stops)
+        for route in routes.values():
+            stop_ids.update(route["stops"])
+        self.stop_ids = np.array(sorted(stop_ids), dtype=np.int64)
+        self.stop_rows = {int(stop_id): row for row, stop_id in enumerate(self.stop_ids)}
+
+        # Lay out both directions of every route as consecutive patterns
+        flat_stops, flat_pattern, flat_minutes = [], [], []
+        self.pattern_route = []
+        self.routes = {}  # id and name of every route with a pattern
+        for route_id in sorted(routes):
+            route = routes[route_id]
+            if len(route["stops"]) < 2:
+                continue
+            self.routes[route_id] = {"id": route["id"], "name": route["name"]}
+            hop_minutes = (route["estimated_time"] or 0) / (len(route["stops"]) - 1)
+            for sequence in (route["stops"], route["stops"][::-1]):
+                pattern = len(self.pattern_route)
+                self.pattern_route.append(route_id)
+                flat_stops.extend(self.stop_rows[stop_id] for stop_id in sequence)
+                flat_pattern.extend([pattern] * len(sequence))
+                flat_minutes.extend([0.0] + [hop_minutes] * (len(sequence) - 1))
+
+        self.flat_stop = np.array(flat_stops, dtype=np.int64)
+        self.flat_pattern = np.array(flat_pattern, dtype=np.int64)
+        self.flat_minutes = np.array(flat_minutes)
+        positions = np.arange(len(self.flat_stop))
+        starts = np.ones(len(self.flat_stop), dtype=bool)
+        starts[1:] = self.flat_pattern[1:] != self.flat_pattern[:-1]
+        self.pattern_start = np.nonzero(starts)[0]
+        self.pattern_end = np.append(self.pattern_start[1:], len(self.flat_stop))
+        self.pattern_first = np.maximum.accumulate(np.where(starts, positions, 0))
+
+        # stop -> patterns serving it, as CSR arrays
+        pairs = np.unique(np.stack((self.flat_stop, self.flat_pattern), axis=1), axis=0) \
+            if len(self.flat_stop) else np.zeros((0, 2), dtype=np.int64)
+        self.stop_patterns = pairs[:, 1]
+        self.stop_patterns_start = np.searchsorted(pairs[:, 0], np.arange(len(self.stop_ids) + 1))
+
+    def costs(self, stops: Dict[int, dict], crowd_weight: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cost prefix sums along every pattern: ride minutes plus crowding of each stop reached
+        Returns:
+            - density of every stop row
+            - integer cost from the start of its pattern to every flat position
+        """
+        density = np.array([stops.get(int(stop_id), {}).get("density", 0.0) or 0.0 for stop_id in self.stop_ids])
+        if len(self.flat_stop) == 0:
+            return density, np.zeros(0, dtype=np.int64)
+        step = self.flat_minutes + crowd_weight * density[self.flat_stop]
+        step[self.pattern_start] = 0.0
+        totals = np.cumsum(np.rint(step * COST_SCALE).astype(np.int64))
+        return density, totals - totals[self.pattern_first]
+
+    def patterns_through(self, stops: np.ndarray) -> np.ndarray:
+        """Boolean mask of the patterns serving any of the given stops"""
+        mask = np.zeros(len(self.pattern_start), dtype=bool)
+        mask[self.stop_patterns[_ranges(self.stop_patterns_start[stops], self.stop_patterns_start[stops + 1])]] = True
+        return mask
+
+class JourneyPlanner:
+    """
+    RAPTOR-style journey planner over the routes held by a NetworkIndex.
+    Each round of the search boards one more vehicle and scans, with a handful of
+    vectorized operations, only the patterns serving a stop that improved in the
+    previous round.
+
+    Pattern tables are kept per topology version and cost prefix sums per density
+    version, a few of each, so the live index and its snapshots can be planned
+    against in turn without rebuilding each other's tables. Searches run unlocked.
+
+    Journeys are scored in minutes: ride time, plus transfer_penalty per transfer,
+    plus crowd_weight times the density of every stop passed.
+    """
+    def __init__(self, index: NetworkIndex, transfer_penalty: float = 5.0, crowd_weight: float = 0.01,
+                 cached_versions: int = 4):
+        self.index = index
+        self.transfer_penalty = transfer_penalty
+        self.crowd_weight = crowd_weight
+        self.cached_versions = cached_versions
+        self.lock = threading.Lock()
+        self.tables: "OrderedDict[int, PlannerTables]" = OrderedDict()
+        self.costs: "OrderedDict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+
+    def _state(self, index: NetworkIndex) -> Tuple[PlannerTables, np.ndarray, np.ndarray]:
+        """Tables and costs for the current versions of index, building whichever are missing"""
+        with self.lock, index.lock:
+            tables = self.tables.get(index.topology_version)
+            if tables is None:
+                tables = self.tables[index.topology_version] = PlannerTables(index)
+            self.tables.move_to_end(index.topology_version)
+            key = (index.topology_version, index.version)
+            costs = self.costs.get(key)
+            if costs is None:
+                costs = self.costs[key] = tables.costs(index.stops, self.crowd_weight)
+            self.costs.move_to_end(key)
+            while len(self.tables) > self.cached_versions:
+                self.tables.popitem(last=False)
+            while len(self.costs) > self.cached_versions:
+                self.costs.popitem(last=False)
+            return (tables, *costs)
+
+    def plan(self, from_stop: int, to_stop: int, max_transfers: int = 2,
+             index: NetworkIndex = None) -> List[dict]:
+        """
+        Find the best journeys between two stops with up to max_transfers transfers
+        Returns one journey per number of transfers that improves on every journey
+        with fewer transfers, best score first
+        """
+        return self.plan_many(from_stop, [to_stop], max_transfers, index)[to_stop]
+
+    def plan_many(self, from_stop: int, to_stops: List[int], max_transfers: int = 2,
+                  index: NetworkIndex = None) -> Dict[int, List[dict]]:
+        """
+        plan() from one stop to many destinations, sharing a single search
+        Args:
+            index: A NetworkIndex.snapshot() of the planner's index to plan against instead of the live one
+        Returns the journeys of every destination
+        """
+        tables, density, flat_cost = self._state(index or self.index)
+        journeys = {to_stop: [] for to_stop in to_stops}
+        if from_stop not in tables.stop_rows or len(tables.flat_stop) == 0:
+            return journeys
+        source = tables.stop_rows[from_stop]
+        targets = np.array([tables.stop_rows[to_stop] for to_stop in journeys
+                            if to_stop in tables.stop_rows and to_stop != from_stop], dtype=np.int64)
+        if len(targets) == 0:
+            return journeys
+
+        best = np.full(len(tables.stop_ids), UNREACHED, dtype=np.int64)
+        best[source] = 0
+        label = best.copy()  # labels of the stops improved in the previous round
+        penalty = int(round(self.transfer_penalty * COST_SCALE))
+        target_patterns = tables.patterns_through(targets)
+        rounds = []
+
+        marked = np.array([source])
+        for ride in range(1, max_transfers + 2):
+            # Only patterns through a stop improved in the previous round can improve anything,
+            # and in the last round only those that also reach a destination
+            patterns = tables.patterns_through(marked)
+            if ride == max_transfers + 1:
+                patterns &= target_patterns
+            patterns = np.flatnonzero(patterns)
+            flat = _ranges(tables.pattern_start[patterns], tables.pattern_end[patterns])
+            segment = np.repeat(np.arange(len(patterns)) * SEGMENT_OFFSET,
+                                tables.pattern_end[patterns] - tables.pattern_start[patterns])
+            stops, cost = tables.flat_stop[flat], flat_cost[flat]
+            positions = np.arange(len(flat))
+
+            previous = label[stops]
+            boarding = np.where(previous < UNREACHED,
+                                previous + (penalty if ride > 1 else 0) - cost, NO_BOARDING)
+            # Best boarding value seen so far within each pattern, and where it was
+            running = np.minimum.accumulate(boarding - segment) + segment
+            board = np.maximum.accumulate(np.where(boarding == running, positions, 0))
+            arrival = running + cost
+            # Costs never decrease along a journey, so nothing worse than every destination helps
+            improves = ((running < NO_BOARDING) & (board < positions)
+                        & (arrival < best[stops]) & (arrival < best[targets].max()))
+            if not improves.any():
+                break
+
+            # Earliest arrival per stop and the pattern position that achieves it
+            stops, arrival = stops[improves], arrival[improves]
+            alight, board = flat[improves], flat[board[improves]]
+            label = np.full(len(tables.stop_ids), UNREACHED, dtype=np.int64)
+            np.minimum.at(label, stops, arrival)
+            winners = arrival == label[stops]
+            marked = np.flatnonzero(label < UNREACHED)
+            best[marked] = label[marked]
+            rounds.append(dict(zip(stops[winners].tolist(),
+                                   zip(alight[winners].tolist(), board[winners].tolist()))))
+            for target in targets[label[targets] < UNREACHED].tolist():
+                journeys[int(tables.stop_ids[target])].append(
+                    self._journey(tables, density, rounds, target, int(label[target])))
+
+        return {to_stop: sorted(found, key=lambda journey: journey["score"])
+                for to_stop, found in journeys.items()}
+
+    def _journey(self, tables: PlannerTables, density: np.ndarray, rounds: List[Dict[int, tuple]],
+                 target: int, cost: int) -> dict:
+        legs = []
+        stop = target
+        for ride in reversed(rounds):
+            alight, board = ride[stop]
+            route = tables.routes[tables.pattern_route[tables.flat_pattern[alight]]]
+            stops = [int(tables.stop_ids[row]) for row in tables.flat_stop[board:alight + 1]]
+            legs.append({
+                "route_id": route["id"],
+                "name": route["name"],
+                "from_stop": stops[0],
+                "to_stop": stops[-1],
+                "stops": stops,
+                "minutes": float(tables.flat_minutes[board + 1:alight + 1].sum())
+            })
+            stop = int(tables.flat_stop[board])
+        legs.reverse()
+
+        visited = [legs[0]["from_stop"]] + [stop_id for leg in legs for stop_id in leg["stops"][1:]]
+        densities = [density[tables.stop_rows[stop_id]] for stop_id in visited]
+        return {
+            "legs": legs,
+            "transfers": len(legs) - 1,
+            "total_minutes": sum(leg["minutes"] for leg in legs),
+            "total_stops": len(visited),
+            "avg_density": float(np.mean(densities)),
+            "score": cost / COST_SCALE
+        }
@@ -1,25 +1,60 @@
+import os
+import numpy as np
 import osmnx as ox
-import networkx as nx
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Optional
 import folium
-from geopy.geocoders import Nominatim
 from geopy.distance import geodesic
+from road_graph import RoadGraph, cache_key
+from geocoding import BatchGeocoder, NominatimBackend
 
 class MapIntegration:
-    def __init__(self):
-        self.graph = None
-        self.geocoder = Nominatim(user_agent="bus_routing_system")
+    def __init__(self, cache_dir: str = "graph_cache", geocoder: BatchGeocoder = None):
+        self.cache_dir = cache_dir
+        self.road_graph: RoadGraph = None
+        self._graph = None
+        self._geocoder = geocoder
+
+    @property
+    def geocoder(self) -> BatchGeocoder:
+        """Cached geocoder, opened on first use; defaults to Nominatim behind geocode_cache.db"""
+        if self._geocoder is None:
+            self._geocoder = BatchGeocoder(NominatimBackend(user_agent="bus_routing_system"))
+        return self._geocoder
+
+    @property
+    def graph(self):
+        """NetworkX view of the loaded road network, built on first use from the cached arrays"""
+        if self._graph is None and self.road_graph is not None:
+            self._graph = self.road_graph.to_networkx()
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+        self.road_graph = RoadGraph.from_networkx(graph) if graph is not None else None
         
-    def load_area(self, place_name: str):
+    def load_area(self, place_name: str, refresh: bool = False):
         """
         Load road network for a specific area
+        The projected graph is stored under cache_dir as memory-mappable arrays,
+        so later starts (including offline ones) skip the download and rebuild
         Args:
             place_name: Name of the area (e.g., "Manhattan, New York, USA")
+            refresh: Download the network again even if it is cached
         """
+        cache_path = os.path.join(self.cache_dir, cache_key(place_name))
+        if not refresh:
+            road_graph = RoadGraph.load(cache_path)
+            if road_graph is not None:
+                self.road_graph = road_graph
+                self._graph = None
+                return
+
         # Download the street network
-        self.graph = ox.graph_from_place(place_name, network_type='drive')
+        graph = ox.graph_from_place(place_name, network_type='drive')
         # Project the graph to UTM
-        self.graph = ox.project_graph(self.graph, to_crs='EPSG:4326')
+        self.graph = ox.project_graph(graph, to_crs='EPSG:4326')
+        self.road_graph.save(cache_path)
         
     def get_coordinates(self, address: str) -> Tuple[float, float]:
         """
@@ -31,14 +66,33 @@ class MapIntegration:
         """
         location = self.geocoder.geocode(address)
         if location:
-            return (location.latitude, location.longitude)
+            return location
         raise ValueError(f"Could not find coordinates for address: {address}")
+
+    def get_coordinates_many(self, addresses: List[str]) -> List[Optional[Tuple[float, float]]]:
+        """
+        Get coordinates for many addresses, answering from the geocode cache first
+        Returns:
+            (latitude, longitude) for every address, or None where it could not be found
+        """
+        return self.geocoder.geocode_many(addresses)
         
     def find_nearest_node(self, lat: float, lon: float) -> int:
         """
         Find the nearest network node to given coordinates
         """
-        return ox.nearest_nodes(self.graph, lon, lat)
+        node_ids, _ = self.snap_many([lat], [lon])
+        return int(node_ids[0])
+
+    def snap_many(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Snap many coordinates to the road network at once
+        Uses the KD-tree stored with the cached graph
+        Returns:
+            - nearest node id for every point
+            - snap distance in metres for every point
+        """
+        return self.road_graph.snap_many(lats, lons)
         
     def create_bus_stops(self, locations: List[Tuple[float, float]], 
                         demands: List[float] = None) -> List[Tuple[int, float, float, float]]:
@@ -52,30 +106,44 @@ class MapIntegration:
         """
         if demands is None:
             demands = [1.0] * len(locations)
+        if not locations:
+            return []
             
-        bus_stops = []
-        for (lat, lon), demand in zip(locations, demands):
-            node_id = self.find_nearest_node(lat, lon)
-            bus_stops.append((node_id, lat, lon, demand))
-        return bus_stops
+        lats, lons = zip(*locations)
+        node_ids, _ = self.snap_many(lats, lons)
+        return [(int(node_id), lat, lon, demand)
+                for node_id, (lat, lon), demand in zip(node_ids, locations, demands)]
+        
+    def distance_matrix(self, bus_stops: List[Tuple[int, float, float, float]]) -> np.ndarray:
+        """
+        Road distance in metres between every ordered pair of bus stops
+        Pairs with no road path fall back to the straight-line distance
+        Returns:
+            n x n matrix whose rows and columns follow bus_stops
+        """
+        nodes = [node for node, _, _, _ in bus_stops]
+        distances = self.road_graph.distance_matrix(nodes)
+        for i, j in zip(*np.nonzero(np.isinf(distances))):
+            _, lat1, lon1, _ = bus_stops[i]
+            _, lat2, lon2, _ = bus_stops[j]
+            distances[i, j] = geodesic((lat1, lon1), (lat2, lon2)).meters
+        np.fill_diagonal(distances, 0.0)
+        return distances
+
+    def road_distance(self, node1: int, node2: int) -> float:
+        """Shortest road distance in metres between two nodes, np.inf if unreachable"""
+        return float(self.road_graph.distance_matrix([node1], [node2])[0, 0])
         
     def calculate_distances(self, bus_stops: List[Tuple[int, float, float, float]]) -> Dict[Tuple[int, int], float]:
         """
         Calculate distances between bus stops using the road network
         """
+        matrix = self.distance_matrix(bus_stops)
         distances = {}
-        for i, (node1, lat1, lon1, _) in enumerate(bus_stops):
-            for j, (node2, lat2, lon2, _) in enumerate(bus_stops):
+        for i, (node1, _, _, _) in enumerate(bus_stops):
+            for j, (node2, _, _, _) in enumerate(bus_stops):
                 if i != j:
-                    # Calculate shortest path distance
-                    try:
-                        path = nx.shortest_path(self.graph, node1, node2, weight='length')
-                        distance = sum(self.graph[u][v][0]['length'] for u, v in zip(path[:-1], path[1:]))
-                        distances[(node1, node2)] = distance
-                    except nx.NetworkXNoPath:
-                        # If no path exists, use straight-line distance
-                        distance = geodesic((lat1, lon1), (lat2, lon2)).meters
-                        distances[(node1, node2)] = distance
+                    distances[(node1, node2)] = float(matrix[i, j])
         return distances
         
     def visualize_route(self, route: List[int], center_lat: float, center_lon: float):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, JSON, Index, PrimaryKeyConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -22,19 +22,35 @@ class Route(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    stops = Column(JSON)  # List of stop IDs in order
+    stops = Column(JSON)  # List of stop IDs in order, mirrored row by row in route_stops
     total_distance = Column(Float)
     estimated_time = Column(Integer)  # in minutes
-    is_active = Column(Boolean, default=True)
+    is_active = Column(Boolean, default=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class RouteStop(Base):
+    __tablename__ = "route_stops"
+
+    route_id = Column(Integer, ForeignKey("routes.id"))
+    stop_id = Column(Integer, ForeignKey("bus_stops.id"))
+    seq = Column(Integer)  # position of the stop in the route, from 0
+
+    route = relationship("Route")
+    stop = relationship("BusStop")
+
+    __table_args__ = (
+        PrimaryKeyConstraint("route_id", "seq"),
+        # stop -> routes and stop pair -> route segment lookups are answered from this index alone
+        Index("ix_route_stops_stop_route_seq", "stop_id", "route_id", "seq"),
+    )
+
 class Driver(Base):
     __tablename__ = "drivers"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    status = Column(String, default="off_duty")  # active, on_break, off_duty
+    status = Column(String, default="off_duty", index=True)  # active, on_break, off_duty
     current_route_id = Column(Integer, ForeignKey("routes.id"), nullable=True)
     hours_today = Column(Float, default=0.0)
     break_slots = Column(JSON, default=list)  # List of break time slots
@@ -66,4 +82,25 @@ class CrowdData(Base):
     density = Column(Float)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
-    stop = relationship("BusStop") 
\ No newline at end of file
+    stop = relationship("BusStop")
+
+    __table_args__ = (
+        Index("ix_crowd_data_stop_timestamp", "stop_id", "timestamp"),
+        Index("ix_crowd_data_timestamp", "timestamp"),
+    )
+
+class CrowdDataRollup(Base):
+    __tablename__ = "crowd_data_rollups"
+
+    resolution = Column(Integer)  # bucket size in seconds: 60, 900 or 3600
+    stop_id = Column(Integer, ForeignKey("bus_stops.id"))
+    bucket_start = Column(DateTime)
+    count = Column(Integer, default=0)
+    density_sum = Column(Float, default=0.0)
+    density_min = Column(Float)
+    density_max = Column(Float)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("resolution", "stop_id", "bucket_start"),
+        Index("ix_crowd_data_rollups_bucket", "resolution", "bucket_start"),
+    ) 
\ No newline at end of file
@@ -0,0 +1,234 @@
+import threading
+from typing import List, Dict, Set, Tuple, Optional, Callable
+import numpy as np
+
+import models
+
+class NetworkIndex:
+    """
+    In-process index of bus stops and active routes used by the read path of the API.
+    Keeps stop attributes and a stop -> routes mapping in memory so that route
+    lookups can be answered without querying the database. Write endpoints patch
+    the index after their transaction commits.
+
+    Every route also keeps prefix sums of the density and demand of its stops, so the
+    averages over any segment are two lookups whatever the route length.
+
+    Entries are replaced rather than mutated, so snapshot() only has to copy the
+    top-level dicts to give readers a consistent view.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.stops: Dict[int, dict] = {}
+        self.routes: Dict[int, dict] = {}
+        self.stop_routes: Dict[int, Set[int]] = {}
+        self.stop_positions: Dict[int, List[Tuple[int, int]]] = {}  # stop -> (route, position) of every visit
+        self.version = 0  # bumped on every change
+        self.topology_version = 0  # bumped when stops or routes are added or replaced
+
+    def rebuild(self, db):
+        """Reload every stop and active route from the database"""
+        stops = db.query(models.BusStop).all()
+        routes = db.query(models.Route).filter(models.Route.is_active == True).all()
+        with self.lock:
+            self.stops = {}
+            self.routes = {}
+            self.stop_routes = {}
+            self.stop_positions = {}
+            for stop in stops:
+                self._set_stop(stop)
+            for route in routes:
+                self._set_route(route)
+            self.version += 1
+            self.topology_version += 1
+
+    def upsert_stop(self, stop: models.BusStop):
+        """Add or replace a stop after it has been written to the database"""
+        with self.lock:
+            self._set_stop(stop)
+            self.version += 1
+            self.topology_version += 1
+
+    def upsert_route(self, route: models.Route):
+        """Add or replace a route after it has been written to the database"""
+        with self.lock:
+            self._drop_route(route.id)
+            if route.is_active:
+                self._set_route(route)
+            self.version += 1
+            self.topology_version += 1
+
+    def update_densities(self, densities: Dict[int, float]):
+        """Patch the current density of many stops at once"""
+        with self.lock:
+            changed: Dict[int, Dict[int, float]] = {}  # route -> position -> density
+            for stop_id, density in densities.items():
+                if stop_id in self.stops:
+                    self.stops[stop_id] = {**self.stops[stop_id], "density": density}
+                    for route_id, idx in self.stop_positions.get(stop_id, ()):
+                        changed.setdefault(route_id, {})[idx] = density
+            for route_id, positions in changed.items():
+                route = dict(self.routes[route_id])
+                route["density"] = route["density"].copy()
+                route["density"][list(positions)] = list(positions.values())
+                route["density_prefix"] = np.concatenate(([0.0], np.cumsum(route["density"])))
+                self.routes[route_id] = route
+            self.version += 1
+
+    def snapshot(self) -> "NetworkIndex":
+        """Consistent read-only view of the index that later updates do not affect"""
+        view = NetworkIndex()
+        with self.lock:
+            view.stops = dict(self.stops)
+            view.routes = dict(self.routes)
+            view.stop_routes = dict(self.stop_routes)
+            view.stop_positions = dict(self.stop_positions)
+            view.version = self.version
+            view.topology_version = self.topology_version
+        return view
+
+    def get_stop(self, stop_id: int) -> Optional[dict]:
+        with self.lock:
+            return self.stops.get(stop_id)
+
+    def candidate_routes(self, from_stop: int, to_stop: int,
+                         density_at: Callable[[int, float], float] = None) -> List[dict]:
+        """
+        Score every active route that serves both stops
+        Args:
+            density_at: Optional (stop_id, minutes from now) -> density used instead of the
+                        current density, e.g. to score by expected crowding at arrival time
+        Returns one entry per route, ordered by route id
+        """
+        with self.lock:
+            return [self._score_segment(self.routes[route_id], from_stop, to_stop, density_at)
+                    for route_id in self._serving_routes(from_stop, to_stop)]
+
+    def best_route(self, from_stop: int, to_stop: int,
+                   density_at: Callable[[int, float], float] = None) -> Optional[dict]:
+        """
+        Lowest scoring route serving both stops, as returned by candidate_routes()
+        With current densities every candidate is scored from the prefix sums and only
+        the winner's stop details are built
+        """
+        with self.lock:
+            route_ids = self._serving_routes(from_stop, to_stop)
+            if not route_ids:
+                return None
+            if density_at is not None:
+                return min(self.candidate_routes(from_stop, to_stop, density_at), key=lambda x: x["route_score"])
+            best_id = min(route_ids, key=lambda route_id: self._segment_totals(
+                self.routes[route_id], from_stop, to_stop)[2])
+            return self._score_segment(self.routes[best_id], from_stop, to_stop)
+
+    def _serving_routes(self, from_stop: int, to_stop: int) -> List[int]:
+        return sorted(self.stop_routes.get(from_stop, set()) & self.stop_routes.get(to_stop, set()))
+
+    def _set_stop(self, stop: models.BusStop):
+        self.stops[stop.id] = {
+            "id": stop.id,
+            "name": stop.name,
+            "latitude": stop.latitude,
+            "longitude": stop.longitude,
+            "density": stop.current_density,
+            "demand": stop.base_demand
+        }
+        for route_id in {route_id for route_id, _ in self.stop_positions.get(stop.id, ())}:
+            self.routes[route_id] = self._with_sums(dict(self.routes[route_id]))
+
+    def _set_route(self, route: models.Route):
+        stops = list(route.stops or [])
+        positions = {}
+        for idx, stop_id in enumerate(stops):
+            positions.setdefault(stop_id, idx)
+            self.stop_routes[stop_id] = self.stop_routes.get(stop_id, set()) | {route.id}
+            self.stop_positions[stop_id] = self.stop_positions.get(stop_id, []) + [(route.id, idx)]
+        self.routes[route.id] = self._with_sums({
+            "id": route.id,
+            "name": route.name,
+            "stops": stops,
+            "positions": positions,
+            "total_distance": route.total_distance,
+            "estimated_time": route.estimated_time
+        })
+
+    def _with_sums(self, route: dict) -> dict:
+        """Set the density and demand prefix sums of a route from its stops"""
+        stops = [self.stops.get(stop_id) for stop_id in route["stops"]]
+        route["density"] = np.array([(stop["density"] or 0.0) if stop else 0.0 for stop in stops], dtype=np.float64)
+        demand = np.array([(stop["demand"] or 0.0) if stop else 0.0 for stop in stops], dtype=np.float64)
+        route["density_prefix"] = np.concatenate(([0.0], np.cumsum(route["density"])))
+        route["demand_prefix"] = np.concatenate(([0.0], np.cumsum(demand)))
+        return route
+
+    def _drop_route(self, route_id: int):
+        route = self.routes.pop(route_id, None)
+        if route is None:
+            return
+        for stop_id in route["positions"]:
+            route_ids = self.stop_routes.get(stop_id, set()) - {route_id}
+            if route_ids:
+                self.stop_routes[stop_id] = route_ids
+            else:
+                self.stop_routes.pop(stop_id, None)
+            visits = [visit for visit in self.stop_positions.get(stop_id, ()) if visit[0] != route_id]
+            if visits:
+                self.stop_positions[stop_id] = visits
+            else:
+                self.stop_positions.pop(stop_id, None)
+
+    def _segment_totals(self, route: dict, from_stop: int, to_stop: int) -> Tuple[float, float, float]:
+        """(avg_density, avg_demand, route_score) of a segment in O(1) from the prefix sums"""
+        # Lower score is better - prioritize routes with high demand but manageable density
+        first, last = sorted((route["positions"][from_stop], route["positions"][to_stop]))
+        count = last - first + 1
+        avg_density = (route["density_prefix"][last + 1] - route["density_prefix"][first]) / count
+        avg_demand = (route["demand_prefix"][last + 1] - route["demand_prefix"][first]) / count
+        return float(avg_density), float(avg_demand), float(avg_density / (avg_demand + 1))
+
+    def _score_segment(self, route: dict, from_stop: int, to_stop: int,
+                       density_at: Callable[[int, float], float] = None) -> dict:
+        from_idx = route["positions"][from_stop]
+        to_idx = route["positions"][to_stop]
+
+        # Get the stops in the correct order
+        if from_idx < to_idx:
+            route_stops = route["stops"][from_idx:to_idx + 1]
+        else:
+            route_stops = route["stops"][to_idx:from_idx + 1]
+            route_stops.reverse()
+
+        stop_details = []
+
+        # Minutes between consecutive stops, assuming an even spread of the route's time
+        hop_minutes = (route["estimated_time"] or 0) / max(len(route["stops"]) - 1, 1)
+
+        for hop, stop_id in enumerate(route_stops):
+            stop = self.stops[stop_id]
+            density = stop["density"] if density_at is None else density_at(stop_id, hop * hop_minutes)
+            stop_details.append({
+                "id": stop["id"],
+                "name": stop["name"],
+                "density": density,
+                "demand": stop["demand"]
+            })
+
+        if density_at is None:
+            avg_density, avg_demand, route_score = self._segment_totals(route, from_stop, to_stop)
+        else:
+            avg_density = sum(detail["density"] for detail in stop_details) / len(route_stops)
+            avg_demand = sum(detail["demand"] for detail in stop_details) / len(route_stops)
+            # Lower score is better - prioritize routes with high demand but manageable density
+            route_score = avg_density / (avg_demand + 1)  # Add 1 to avoid division by zero
+
+        return {
+            "route_id": route["id"],
+            "name": route["name"],
+            "stops": route_stops,
+            "stop_details": stop_details,
+            "total_distance": route["total_distance"],
+            "estimated_time": route["estimated_time"],
+            "avg_density": avg_density,
+            "avg_demand": avg_demand,
+            "route_score": route_score
+        }
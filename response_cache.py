@@ -0,0 +1,95 @@
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional, Tuple
+from fastapi import Request, Response
+
+class ResponseCache:
+    """
+    LRU cache of serialized responses, each stamped with the data version it was built from.
+    A cached body is served while the version is unchanged and rebuilt once it moves on.
+    ETags combine a per-process token, the cache key and the version, so clients
+    sending If-None-Match get a bodyless 304 until the data changes.
+    """
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Hashable, Tuple[int, bytes]]" = OrderedDict()
+        # Versions restart with the process, so ETags from a previous run must not match
+        self.token = uuid.uuid4().hex[:8]
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def etag(self, key: Hashable, version: int) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+        return f'"{self.token}-{digest}-{version}"'
+
+    def _lookup(self, key: Hashable, version: int) -> Optional[bytes]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def _store(self, key: Hashable, version: int, body: bytes):
+        with self.lock:
+            self.entries[key] = (version, body)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_build(self, key: Hashable, version: int, build: Callable[[], bytes]) -> bytes:
+        """Cached body for key at version, calling build() on a miss"""
+        body = self._lookup(key, version)
+        if body is None:
+            body = build()
+            self._store(key, version, body)
+        return body
+
+    def _not_modified(self, request: Request, etag: str) -> Optional[Response]:
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(",")):
+            with self.lock:
+                self.not_modified += 1
+            return Response(status_code=304, headers={"ETag": etag})
+        return None
+
+    def respond(self, request: Request, key: Hashable, version: int, build: Callable[[], bytes],
+                media_type: str = "application/json") -> Response:
+        """
+        Response for key at version: 304 if the client already holds it, otherwise the cached body
+        Args:
+            version: Data version read before building, so a concurrent write can only make the entry stale
+            build: Serializes the response body; exceptions propagate and nothing is cached
+        """
+        etag = self.etag(key, version)
+        return self._not_modified(request, etag) or Response(
+            self.get_or_build(key, version, build), media_type=media_type, headers={"ETag": etag})
+
+    async def respond_async(self, request: Request, key: Hashable, version: int,
+                            build: Callable[[], Awaitable[bytes]], media_type: str = "application/json") -> Response:
+        """respond() for bodies built by a coroutine, e.g. one reading through an AsyncSession"""
+        etag = self.etag(key, version)
+        response = self._not_modified(request, etag)
+        if response is not None:
+            return response
+        body = self._lookup(key, version)
+        if body is None:
+            body = await build()
+            self._store(key, version, body)
+        return Response(body, media_type=media_type, headers={"ETag": etag})
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified
+            }
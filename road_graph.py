@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+from typing import List, Tuple, Optional
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+FORMAT_VERSION = 1
+ARRAYS = ("node_ids", "x", "y", "indptr", "indices", "lengths")
+# Upper bound on the (sources x nodes) block produced by one Dijkstra batch
+DIJKSTRA_BLOCK_BYTES = 256 * 1024 * 1024
+EARTH_RADIUS_M = 6371008.8
+
+class RoadGraph:
+    """
+    Compact CSR representation of a directed road network.
+    Nodes are sorted by OSM id so a node id maps to its row with a binary search.
+    The arrays can be saved to a directory of .npy files and memory-mapped back,
+    which avoids rebuilding the NetworkX graph on every process start.
+    """
+    def __init__(self, node_ids: np.ndarray, x: np.ndarray, y: np.ndarray,
+                 indptr: np.ndarray, indices: np.ndarray, lengths: np.ndarray,
+                 crs: str = "EPSG:4326"):
+        self.node_ids = node_ids  # sorted OSM node ids
+        self.x = x  # longitude of every node
+        self.y = y  # latitude of every node
+        self.indptr = indptr  # CSR row pointers, one row of outgoing edges per node
+        self.indices = indices  # CSR column (target node row) of every edge
+        self.lengths = lengths  # length of every edge in metres
+        self.crs = crs
+        self._matrix = None
+        self._symmetric = None
+        self._tree = None
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def from_networkx(cls, graph: nx.MultiDiGraph) -> "RoadGraph":
+        """Build the CSR arrays from an osmnx graph"""
+        node_ids = np.array(sorted(graph.nodes), dtype=np.int64)
+        x = np.array([graph.nodes[node]['x'] for node in node_ids], dtype=np.float64)
+        y = np.array([graph.nodes[node]['y'] for node in node_ids], dtype=np.float64)
+
+        edges = [(u, v, data.get('length', 0.0)) for u, v, data in graph.edges(data=True)]
+        sources = np.searchsorted(node_ids, np.array([u for u, _, _ in edges], dtype=np.int64))
+        targets = np.searchsorted(node_ids, np.array([v for _, v, _ in edges], dtype=np.int64))
+        lengths = np.array([length for _, _, length in edges], dtype=np.float64)
+
+        # Group edges by source row to form the CSR layout
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(node_ids)), out=indptr[1:])
+        return cls(node_ids, x, y, indptr, targets[order].astype(np.int32), lengths[order],
+                   crs=str(graph.graph.get('crs', "EPSG:4326")))
+
+    def to_networkx(self) -> nx.MultiDiGraph:
+        """Materialize an osmnx-compatible MultiDiGraph (slow for large areas)"""
+        graph = nx.MultiDiGraph(crs=self.crs)
+        graph.add_nodes_from(
+            (int(node), {'x': float(x), 'y': float(y)})
+            for node, x, y in zip(self.node_ids, self.x, self.y)
+        )
+        sources = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        graph.add_edges_from(
+            (int(self.node_ids[u]), int(self.node_ids[v]), {'length': float(length)})
+            for u, v, length in zip(sources, self.indices, self.lengths)
+        )
+        return graph
+
+    def node_index(self, node_id: int) -> int:
+        """Row of an OSM node id in the CSR arrays"""
+        row = int(np.searchsorted(self.node_ids, node_id))
+        if row >= self.num_nodes or self.node_ids[row] != node_id:
+            raise KeyError(f"Node {node_id} is not in the road graph")
+        return row
+
+    def matrix(self) -> csr_matrix:
+        """Sparse adjacency matrix keeping the shortest of any parallel edges"""
+        if self._matrix is None:
+            rows = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+            cols = np.asarray(self.indices, dtype=np.int64)
+            lengths = np.asarray(self.lengths)
+            # Sort by (row, col, length) and keep the first edge of every (row, col) pair
+            order = np.lexsort((lengths, cols, rows))
+            rows, cols, lengths = rows[order], cols[order], lengths[order]
+            first = np.ones(len(rows), dtype=bool)
+            first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+            # csgraph treats explicit zeros as missing edges, so nudge zero lengths
+            weights = np.maximum(lengths[first], 1e-9)
+            self._matrix = csr_matrix((weights, (rows[first], cols[first])),
+                                      shape=(self.num_nodes, self.num_nodes))
+        return self._matrix
+
+    def is_symmetric(self) -> bool:
+        """True when every road can be driven both ways with the same length"""
+        if self._symmetric is None:
+            matrix = self.matrix()
+            self._symmetric = (matrix != matrix.T).nnz == 0
+        return self._symmetric
+
+    def distance_matrix(self, source_nodes: List[int], target_nodes: List[int] = None) -> np.ndarray:
+        """
+        Shortest road distance from every source node to every target node
+        Runs one Dijkstra per distinct source, in blocks bounded by DIJKSTRA_BLOCK_BYTES,
+        and keeps only the target columns. Unreachable pairs are np.inf
+        Args:
+            source_nodes: OSM node ids to start from
+            target_nodes: OSM node ids to reach, defaults to source_nodes
+        """
+        if target_nodes is None:
+            target_nodes = source_nodes
+        source_rows = np.array([self.node_index(node) for node in source_nodes], dtype=np.int64)
+        target_rows = np.array([self.node_index(node) for node in target_nodes], dtype=np.int64)
+        unique_sources, source_pos = np.unique(source_rows, return_inverse=True)
+        unique_targets, target_pos = np.unique(target_rows, return_inverse=True)
+
+        # On a symmetric network the distances from a node equal the distances to it,
+        # so search from whichever side has fewer distinct nodes
+        if len(unique_targets) < len(unique_sources) and self.is_symmetric():
+            return self.distance_matrix(target_nodes, source_nodes).T
+
+        matrix = self.matrix()
+        block = max(1, DIJKSTRA_BLOCK_BYTES // (8 * max(self.num_nodes, 1)))
+        distances = np.empty((len(unique_sources), len(unique_targets)))
+        for start in range(0, len(unique_sources), block):
+            rows = unique_sources[start:start + block]
+            result = dijkstra(matrix, directed=True, indices=rows)
+            distances[start:start + block] = result[:, unique_targets]
+        return distances[source_pos][:, target_pos]
+
+    def _project(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Equirectangular projection to metres around the network's mean latitude"""
+        cos_ref = np.cos(np.radians(float(np.mean(self.y)))) if self.num_nodes else 1.0
+        return np.column_stack((
+            EARTH_RADIUS_M * np.radians(np.asarray(lons, dtype=np.float64)) * cos_ref,
+            EARTH_RADIUS_M * np.radians(np.asarray(lats, dtype=np.float64))
+        ))
+
+    def spatial_index(self) -> cKDTree:
+        """KD-tree over the projected node coordinates, built once per graph"""
+        if self._tree is None:
+            self._tree = cKDTree(self._project(self.y, self.x))
+        return self._tree
+
+    def snap_many(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Snap coordinates to their nearest road nodes
+        Args:
+            lats: Latitudes of the points
+            lons: Longitudes of the points
+        Returns:
+            - OSM node id of the nearest node for every point
+            - distance in metres from every point to that node
+        """
+        distances, rows = self.spatial_index().query(self._project(lats, lons))
+        return np.asarray(self.node_ids)[rows], distances
+
+    def save(self, directory: str):
+        """
+        Write the arrays to directory as .npy files
+        Everything is written to a fresh sibling directory first and swapped in with a
+        rename, so a crash or a concurrent load never sees a half-written cache
+        """
+        directory = os.path.abspath(directory)
+        parent, name = os.path.split(directory)
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{name}.", suffix=".tmp", dir=parent)
+        try:
+            for array in ARRAYS:
+                np.save(os.path.join(tmp_dir, f"{array}.npy"), np.ascontiguousarray(getattr(self, array)))
+            with open(os.path.join(tmp_dir, "spatial_index.pkl"), "wb") as f:
+                pickle.dump(self.spatial_index(), f, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump({"version": FORMAT_VERSION, "crs": self.crs,
+                           "nodes": self.num_nodes, "edges": self.num_edges}, f)
+            # A directory can only be renamed over an empty one, so move the old cache aside first
+            old_dir = None
+            if os.path.exists(directory):
+                old_dir = tempfile.mkdtemp(prefix=f".{name}.", suffix=".old", dir=parent)
+                os.replace(directory, os.path.join(old_dir, name))
+            os.replace(tmp_dir, directory)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> Optional["RoadGraph"]:
+        """
+        Load arrays saved by save()
+        Returns None if the directory holds no usable graph (missing, from another
+        format version, truncated or otherwise corrupt) so the caller can rebuild it
+        """
+        mmap_mode = 'r' if mmap else None
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+            if meta.get("version") != FORMAT_VERSION:
+                return None
+            arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+                      for name in ARRAYS}
+            road_graph = cls(crs=meta["crs"], **arrays)
+            if (road_graph.num_nodes != meta["nodes"] or road_graph.num_edges != meta["edges"]
+                    or len(road_graph.indptr) != road_graph.num_nodes + 1):
+                return None
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+        try:
+            with open(os.path.join(directory, "spatial_index.pkl"), "rb") as f:
+                road_graph._tree = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            pass  # rebuilt on first use
+        return road_graph
+
+def cache_key(place_name: str) -> str:
+    """Filesystem-safe directory name for a place"""
+    slug = re.sub(r'[^a-z0-9]+', '_', place_name.lower()).strip('_')
+    digest = hashlib.sha1(place_name.encode('utf-8')).hexdigest()[:8]
+    return f"{slug}_{digest}"
@@ -0,0 +1,96 @@
+from typing import List, Tuple, Dict
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.orm import Session, aliased
+
+import models
+
+RouteStop = models.RouteStop
+
+def ensure_schema(bind):
+    """
+    Create the route_stops table and the indexes added after the first release on
+    existing databases, then backfill route_stops for routes that have no rows yet
+    """
+    RouteStop.__table__.create(bind=bind, checkfirst=True)
+    for table in (models.Route.__table__, models.Driver.__table__, RouteStop.__table__):
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    with Session(bind) as db:
+        if backfill(db):
+            db.commit()
+
+def _rows(route_id: int, stops: List[int]) -> List[dict]:
+    return [{"route_id": route_id, "stop_id": stop_id, "seq": seq} for seq, stop_id in enumerate(stops or [])]
+
+def backfill(db: Session) -> int:
+    """
+    Copy the JSON stop list of every route without route_stops rows into route_stops
+    Does not commit
+    Returns the number of rows written
+    """
+    has_rows = select(RouteStop.route_id).where(RouteStop.route_id == models.Route.id).exists()
+    rows = [row for route_id, stops in db.query(models.Route.id, models.Route.stops).filter(~has_rows)
+            for row in _rows(route_id, stops)]
+    if rows:
+        db.execute(insert(RouteStop), rows)
+    return len(rows)
+
+def sync_route(db: Session, route: models.Route):
+    """Replace the route_stops rows of a route with its current stop list; does not commit"""
+    db.execute(delete(RouteStop).where(RouteStop.route_id == route.id))
+    rows = _rows(route.id, route.stops)
+    if rows:
+        db.execute(insert(RouteStop), rows)
+
+def routes_serving(db: Session, stop_id: int, active_only: bool = True) -> List[Tuple[int, int]]:
+    """(route_id, seq) of every visit a route makes to the stop"""
+    query = db.query(RouteStop.route_id, RouteStop.seq).filter(RouteStop.stop_id == stop_id)
+    if active_only:
+        query = query.join(models.Route, models.Route.id == RouteStop.route_id).filter(models.Route.is_active == True)
+    return [tuple(row) for row in query.order_by(RouteStop.route_id, RouteStop.seq)]
+
+def routes_between(db: Session, from_stop: int, to_stop: int,
+                   active_only: bool = True) -> List[Tuple[int, int, int]]:
+    """
+    Routes serving both stops, in one query over the stop index
+    Returns:
+        (route_id, seq of from_stop, seq of to_stop) per route, using the first visit to each stop
+    """
+    origin, destination = aliased(RouteStop), aliased(RouteStop)
+    query = db.query(origin.route_id, func.min(origin.seq), func.min(destination.seq)).join(
+        destination, destination.route_id == origin.route_id
+    ).filter(origin.stop_id == from_stop, destination.stop_id == to_stop)
+    if active_only:
+        query = query.join(models.Route, models.Route.id == origin.route_id).filter(models.Route.is_active == True)
+    return [tuple(row) for row in query.group_by(origin.route_id).order_by(origin.route_id)]
+
+def segment(db: Session, route_id: int, from_stop: int, to_stop: int) -> List[int]:
+    """
+    Stops ridden from from_stop to to_stop along a route, both included, in riding order
+    Empty if the route does not serve both stops
+    """
+    def first_visit(stop_id: int):
+        return select(func.min(RouteStop.seq)).where(
+            RouteStop.route_id == route_id, RouteStop.stop_id == stop_id).scalar_subquery()
+
+    start, end = first_visit(from_stop), first_visit(to_stop)
+    forward = start <= end
+    rows = db.query(RouteStop.stop_id, forward).filter(
+        RouteStop.route_id == route_id,
+        RouteStop.seq.between(case((forward, start), else_=end), case((forward, end), else_=start))
+    ).order_by(RouteStop.seq).all()
+    stops = [stop_id for stop_id, _ in rows]
+    if rows and not rows[0][1]:
+        stops.reverse()
+    return stops
+
+def terminals(db: Session) -> Dict[int, Tuple[int, int]]:
+    """First and last stop of every route that has any"""
+    last = select(RouteStop.route_id, func.max(RouteStop.seq).label("seq")).group_by(RouteStop.route_id).subquery()
+    first_stop, last_stop = aliased(RouteStop), aliased(RouteStop)
+    rows = db.execute(
+        select(last.c.route_id, first_stop.stop_id, last_stop.stop_id)
+        .join(first_stop, (first_stop.route_id == last.c.route_id) & (first_stop.seq == 0))
+        .join(last_stop, (last_stop.route_id == last.c.route_id) & (last_stop.seq == last.c.seq))
+    )
+    return {route_id: (first, final) for route_id, first, final in rows}
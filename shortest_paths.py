@@ -0,0 +1,146 @@
+import heapq
+from typing import List, Tuple, Dict
+import networkx as nx
+
+class ShortestPathCache:
+    """
+    Memoized single-source shortest-path trees over a weighted networkx graph.
+    Each tree is computed once with Dijkstra and reused for every query from the
+    same source until the graph changes and invalidate() is called. Edge weight
+    changes made through update_edge_weight() repair the cached trees instead.
+    """
+    def __init__(self, graph: nx.Graph, weight: str = 'weight'):
+        self.graph = graph
+        self.weight = weight
+        self.trees: Dict[int, Tuple[Dict[int, float], Dict[int, int]]] = {}
+
+    def invalidate(self):
+        """Drop every cached tree, called whenever stops or connections change"""
+        self.trees.clear()
+
+    def update_edge_weight(self, u: int, v: int, weight: float):
+        """
+        Set the weight of edge (u, v), adding the edge if it is missing, and repair every cached tree
+        A decrease is propagated Dijkstra-style from the endpoint it improves. An increase only
+        matters when the edge is on the tree, and then only the subtree below it is settled again
+        from its neighbours outside it; trees where that subtree is most of the tree are dropped
+        and rebuilt on their next query.
+        """
+        old = self.graph[u][v][self.weight] if self.graph.has_edge(u, v) else float('inf')
+        self.graph.add_edge(u, v, **{self.weight: weight})
+        if weight == old:
+            return
+        arcs = [(u, v)] if self.graph.is_directed() else [(u, v), (v, u)]
+        for source in list(self.trees):
+            dist, parent = self.trees[source]
+            for a, b in arcs:
+                if weight < old:
+                    if dist.get(a, float('inf')) + weight < dist.get(b, float('inf')):
+                        dist[b] = dist[a] + weight
+                        parent[b] = a
+                        self._settle(dist, parent, [(dist[b], b)])
+                elif parent.get(b) == a:
+                    # At most one direction of the edge can be on the tree
+                    if not self._repair_subtree(dist, parent, b):
+                        del self.trees[source]
+                    break
+
+    def tree(self, source: int) -> Tuple[Dict[int, float], Dict[int, int]]:
+        """
+        Get the shortest-path tree rooted at source
+        Returns:
+            - distance from source to every reachable node
+            - parent of every reachable node on its shortest path (source maps to None)
+        """
+        if source not in self.trees:
+            self.trees[source] = self._dijkstra(source)
+        return self.trees[source]
+
+    def distance(self, source: int, target: int) -> float:
+        dist, _ = self.tree(source)
+        return dist.get(target, float('inf'))
+
+    def path(self, source: int, target: int) -> List[int]:
+        """Reconstruct the shortest path from source to target"""
+        dist, parent = self.tree(source)
+        if target not in dist:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}")
+        path = []
+        current = target
+        while current is not None:
+            path.append(current)
+            current = parent[current]
+        return path[::-1]
+
+    def _dijkstra(self, source: int) -> Tuple[Dict[int, float], Dict[int, int]]:
+        if source not in self.graph:
+            raise nx.NodeNotFound(f"Stop {source} is not in the network")
+        adj = self.graph.adj
+        dist = {source: 0.0}
+        parent = {source: None}
+        done = set()
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            for v, data in adj[u].items():
+                nd = d + data[self.weight]
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+        return dist, parent
+
+    def _settle(self, dist: Dict[int, float], parent: Dict[int, int], heap: List[Tuple[float, int]]):
+        """Continue Dijkstra from the given (distance, node) entries, only lowering distances"""
+        adj = self.graph.adj
+        heapq.heapify(heap)
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for v, data in adj[u].items():
+                nd = d + data[self.weight]
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+    def _repair_subtree(self, dist: Dict[int, float], parent: Dict[int, int], root: int) -> bool:
+        """
+        Recompute the distances of root and every node below it in the tree after the edge into
+        root got heavier; nodes left unreachable are removed
+        Returns False without changing anything if the subtree is over half of the tree
+        """
+        adj = self.graph.adj
+        affected = {root}
+        stack = [root]
+        while stack:
+            u = stack.pop()
+            for v in adj[u]:
+                if v not in affected and parent.get(v) == u:
+                    affected.add(v)
+                    stack.append(v)
+        if 2 * len(affected) > len(dist):
+            return False
+
+        for u in affected:
+            del dist[u], parent[u]
+        # Cheapest way into each affected node from the part of the tree that did not change
+        predecessors = self.graph.pred if self.graph.is_directed() else adj
+        heap = []
+        for v in affected:
+            best, via = float('inf'), None
+            for u, data in predecessors[v].items():
+                if u in dist:
+                    nd = dist[u] + data[self.weight]
+                    if nd < best:
+                        best, via = nd, u
+            if via is not None:
+                dist[v] = best
+                parent[v] = via
+                heap.append((best, v))
+        self._settle(dist, parent, heap)
+        return True
@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+import pytest
+
+# database.py reads DATABASE_URL at import, so point it at a scratch file before the app is loaded
+_db_dir = tempfile.mkdtemp(prefix="bus_routing_test_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+# Keep the crowd simulator from rewriting densities while tests run
+os.environ.setdefault("DENSITY_UPDATE_INTERVAL", "3600")
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def make_stop(client):
+    def make(name: str = "Stop", latitude: float = 18.52, longitude: float = 73.85) -> dict:
+        response = client.post("/stops", json={"name": name, "latitude": latitude, "longitude": longitude})
+        assert response.status_code == 200
+        return response.json()
+    return make
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import crowd_history
+import models
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        session.add(models.BusStop(id=1, name="Swargate", latitude=18.50, longitude=73.86))
+        session.commit()
+        yield session
+    engine.dispose()
+
+def record(db, start: datetime, minutes: int):
+    crowd_history.record_densities(db, [(1, minute / 100, start + timedelta(minutes=minute))
+                                        for minute in range(minutes)])
+    db.commit()
+
+def test_recent_range_uses_the_minute_tier(db):
+    start = NOW - timedelta(hours=1)
+    record(db, start, 30)
+    crowd_history.compact(db, now=NOW)
+    history = crowd_history.query_history(db, 1, start, NOW, 60, now=NOW)
+    assert history["source_resolution"] == 60
+    assert history["resolution"] == 60
+    assert len(history["points"]) == 30
+
+def test_range_past_fine_tier_retention_falls_back_to_coarser_tier(db):
+    # 30 days ago the raw readings and 1-minute rollups are gone, the 15-minute ones remain
+    start = NOW - timedelta(days=30)
+    record(db, start, 30)
+    crowd_history.compact(db, now=NOW)
+    history = crowd_history.query_history(db, 1, start, start + timedelta(hours=1), 60, now=NOW)
+    assert history["requested_resolution"] == 60
+    assert history["source_resolution"] == 900
+    assert history["resolution"] == 900
+    assert [point["count"] for point in history["points"]] == [15, 15]
+
+def test_resolution_widened_to_a_multiple_of_the_source_tier(db):
+    start = NOW - timedelta(days=30)
+    record(db, start, 60)
+    crowd_history.compact(db, now=NOW)
+    # 1000 s buckets cannot be built from 900 s ones; the next multiple is 1800 s
+    history = crowd_history.query_history(db, 1, start, start + timedelta(hours=1), 1000, now=NOW)
+    assert history["source_resolution"] == 900
+    assert history["resolution"] == 1800
+    assert [point["count"] for point in history["points"]] == [30, 30]
+
+def test_range_older_than_every_tier_reads_the_longest_kept_one():
+    start = NOW - timedelta(days=1000)
+    assert crowd_history.source_resolution(60, start, NOW) == 3600
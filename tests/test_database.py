@@ -0,0 +1,14 @@
+import pytest
+from sqlalchemy.engine import make_url
+
+from database import _check_url, async_url
+
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite:///:memory:",
+                                 "sqlite:///file:db?mode=memory&cache=shared&uri=true"])
+def test_in_memory_sqlite_is_rejected(url):
+    with pytest.raises(ValueError, match="in-memory"):
+        _check_url(make_url(url))
+
+def test_async_url_picks_the_asyncio_driver():
+    assert async_url("sqlite:///./bus_routing.db").drivername == "sqlite+aiosqlite"
+    assert async_url("postgresql+psycopg2://user:pw@host/db").drivername == "postgresql+asyncpg"
@@ -0,0 +1,39 @@
+def test_bulk_update_json(client, make_stop):
+    first, second = make_stop("Swargate"), make_stop("Kharadi")
+    response = client.post("/update-density/bulk", json=[
+        {"stop_id": first["id"], "new_density": 0.4},
+        {"stop_id": second["id"], "new_density": 0.7},
+        {"stop_id": 999999, "new_density": 0.1},
+    ])
+    assert response.status_code == 200
+    body = response.json()
+    assert body["received"] == 3
+    assert body["updated_stops"] == 2
+    assert body["unknown_stop_ids"] == [999999]
+
+def test_bulk_update_ndjson(client, make_stop):
+    stop = make_stop("Hadapsar")
+    lines = [f'{{"stop_id": {stop["id"]}, "new_density": 0.2}}',
+             f'{{"stop_id": {stop["id"]}, "new_density": 0.9}}', ""]
+    response = client.post("/update-density/bulk", content="\n".join(lines).encode(),
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["received"] == 2
+    stops = {s["id"]: s for s in client.get("/stops").json()}
+    # The last reading of a stop wins
+    assert stops[stop["id"]]["current_density"] == 0.9
+
+def test_bulk_update_truncated_json_is_422(client):
+    response = client.post("/update-density/bulk", content=b'[{"stop_id": 1, "new_density": 0.5}, {"stop_id": 2',
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+
+def test_bulk_update_bad_ndjson_line_is_422(client):
+    body = b'{"stop_id": 1, "new_density": 0.5}\n{"stop_id": 2, "new_density":\n'
+    response = client.post("/update-density/bulk", content=body,
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 422
+
+def test_bulk_update_invalid_field_is_422(client):
+    response = client.post("/update-density/bulk", json=[{"stop_id": "abc", "new_density": 0.5}])
+    assert response.status_code == 422
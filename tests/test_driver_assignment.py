@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import models
+import route_stops
+from driver_assignment import assign_off_duty_drivers
+
+NOW = datetime(2026, 10, 17, 9, 0)
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'drivers.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        session.add_all([models.BusStop(id=1, name="A", latitude=18.52, longitude=73.85),
+                         models.BusStop(id=2, name="B", latitude=18.53, longitude=73.86)])
+        route = models.Route(id=1, name="A-B", stops=[1, 2], total_distance=2.0, estimated_time=120)
+        session.add(route)
+        session.flush()
+        route_stops.sync_route(session, route)
+        session.commit()
+        yield session
+    engine.dispose()
+
+def add_driver(db, hours_today: float, updated_at: datetime) -> models.Driver:
+    driver = models.Driver(name="Driver", hours_today=hours_today, updated_at=updated_at)
+    db.add(driver)
+    db.commit()
+    return driver
+
+def test_assignment_adds_route_hours(db):
+    driver = add_driver(db, hours_today=3.0, updated_at=NOW - timedelta(hours=1))
+    assert [(d, r) for d, r, _ in assign_off_duty_drivers(db, now=NOW)] == [(driver.id, 1)]
+    db.refresh(driver)
+    assert driver.status == "active"
+    assert driver.hours_today == 5.0
+
+def test_hours_reset_on_a_new_day(db):
+    # 7 hours yesterday would make a 2 hour route exceed the shift limit if carried over
+    driver = add_driver(db, hours_today=7.0, updated_at=NOW - timedelta(days=1))
+    assert len(assign_off_duty_drivers(db, now=NOW)) == 1
+    db.refresh(driver)
+    assert driver.hours_today == 2.0
+
+def test_shift_limit_counts_todays_hours(db):
+    driver = add_driver(db, hours_today=7.0, updated_at=NOW - timedelta(hours=1))
+    assert assign_off_duty_drivers(db, now=NOW) == []
+    db.refresh(driver)
+    assert driver.status == "off_duty"
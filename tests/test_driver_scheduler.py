@@ -0,0 +1,47 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from crowd_simulation import Driver, DriverScheduler
+
+DAY = datetime(2026, 10, 17, 6)
+
+def on_break_brute_force(drivers, t):
+    return {driver.id for driver in drivers if any(start <= t <= end for start, end in driver.break_slots)}
+
+def test_break_slots_are_read_only():
+    driver = Driver(1, "Rajesh Kumar")
+    driver.add_break_slot(DAY + timedelta(hours=2))
+    with pytest.raises(AttributeError):
+        driver.break_slots.append((DAY, DAY + timedelta(minutes=30)))
+    assert len(driver.break_slots) == 1
+
+def test_replacing_break_slots_refreshes_lookups():
+    scheduler = DriverScheduler()
+    driver = Driver(1, "Rajesh Kumar")
+    scheduler.add_driver(driver)
+    driver.add_break_slot(DAY + timedelta(hours=2))
+    assert scheduler.drivers_on_break(DAY + timedelta(hours=2, minutes=10)) == [driver]
+
+    driver.break_slots = [(DAY + timedelta(hours=5), DAY + timedelta(hours=5, minutes=30)),
+                          (DAY + timedelta(hours=1), DAY + timedelta(hours=1, minutes=15))]
+    assert driver.break_slots[0][0] == DAY + timedelta(hours=1)
+    assert scheduler.drivers_on_break(DAY + timedelta(hours=2, minutes=10)) == []
+    assert scheduler.drivers_on_break(DAY + timedelta(hours=5, minutes=10)) == [driver]
+    assert driver.overlaps_break(DAY + timedelta(hours=4), DAY + timedelta(hours=5))
+    assert not driver.overlaps_break(DAY + timedelta(hours=2), DAY + timedelta(hours=4))
+
+def test_breaks_added_between_queries_are_seen():
+    rng = random.Random(7)
+    scheduler = DriverScheduler()
+    drivers = [Driver(idx, f"Driver {idx}") for idx in range(50)]
+    for driver in drivers:
+        scheduler.add_driver(driver)
+
+    # Interleave additions and queries so both the pending list and the rebuilt tree are used
+    for _ in range(400):
+        driver = rng.choice(drivers)
+        driver.add_break_slot(DAY + timedelta(minutes=rng.randrange(16 * 60)), rng.choice([15, 30, 45]))
+        t = DAY + timedelta(minutes=rng.randrange(16 * 60))
+        assert {d.id for d in scheduler.drivers_on_break(t)} == on_break_brute_force(drivers, t)
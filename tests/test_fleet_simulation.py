@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from fleet_simulation import FleetSimulation, Trip
+
+DAY = datetime(2026, 10, 17, 8)
+
+def test_osm_sized_stop_ids_survive():
+    # OSM node ids no longer fit in 32 bits
+    stops = [5_000_000_001, 5_000_000_002, 5_000_000_003]
+    sim = FleetSimulation({1: stops}, {1: 20}, seed=1)
+    result = sim.run([Trip(1, DAY + timedelta(minutes=10))], DAY, hours=1)
+    assert result.stop.tolist() == stops
+
+def test_trip_before_day_start_is_rejected():
+    sim = FleetSimulation({1: [1, 2, 3]}, {1: 20}, seed=1)
+    with pytest.raises(ValueError):
+        sim.run([Trip(1, DAY - timedelta(minutes=5))], DAY, hours=1)
@@ -0,0 +1,25 @@
+from geocoding import BatchGeocoder, GeocodeCache, StaticBackend
+
+ADDRESSES = {
+    "Swargate Bus Terminal, Pune": (18.5089, 73.8567),
+    "Kharadi Bus Stand, Pune": (18.5515, 73.9345),
+}
+
+def test_geocode_many_only_queries_cache_misses(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode_cache.db"))
+    cache.put_many({"swargate bus terminal, pune": (18.5089, 73.8567)})
+    backend = StaticBackend(ADDRESSES)
+    geocoder = BatchGeocoder(backend, cache)
+    addresses = ["Swargate Bus Terminal, Pune", "Kharadi Bus Stand, Pune",
+                 "kharadi  bus stand,pune", "Nowhere, Pune"]
+
+    first = geocoder.geocode_many(addresses)
+    assert first == [(18.5089, 73.8567), (18.5515, 73.9345), (18.5515, 73.9345), None]
+    # The cached address is not looked up and the spelling variant shares its miss
+    assert backend.queries == ["Kharadi Bus Stand, Pune", "Nowhere, Pune"]
+
+    backend.queries.clear()
+    assert geocoder.geocode_many(addresses) == first
+    # Resolved and unresolvable addresses are both served from the cache now
+    assert backend.queries == []
+    cache.close()
@@ -0,0 +1,36 @@
+def test_routes_etag_and_not_modified(client, make_stop):
+    a, b = make_stop("A"), make_stop("B")
+    client.post("/routes", json={"name": "A-B", "stops": [a["id"], b["id"]],
+                                 "total_distance": 3.0, "estimated_time": 12})
+    first = client.get("/routes")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    repeat = client.get("/routes", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.content == b""
+
+def test_density_write_keeps_routes_cached_but_not_stops(client, make_stop):
+    stop = make_stop("Hadapsar")
+    routes_etag = client.get("/routes").headers["etag"]
+    stops_etag = client.get("/stops").headers["etag"]
+
+    assert client.post("/update-density", json={"stop_id": stop["id"], "new_density": 0.8}).status_code == 200
+    # Densities do not change the topology, so /routes is still fresh
+    assert client.get("/routes", headers={"If-None-Match": routes_etag}).status_code == 304
+    stops = client.get("/stops", headers={"If-None-Match": stops_etag})
+    assert stops.status_code == 200
+    assert stops.headers["etag"] != stops_etag
+
+def test_topology_change_invalidates_routes(client, make_stop):
+    a, b = make_stop("C"), make_stop("D")
+    before = client.get("/routes")
+    etag = before.headers["etag"]
+
+    created = client.post("/routes", json={"name": "C-D", "stops": [a["id"], b["id"]],
+                                           "total_distance": 2.0, "estimated_time": 8}).json()
+    after = client.get("/routes", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["etag"] != etag
+    assert created["id"] in [route["id"] for route in after.json()]
+    assert len(after.json()) == len(before.json()) + 1
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pytest
+
+from road_graph import RoadGraph
+
+def small_graph() -> RoadGraph:
+    # 1 <-> 2 -> 3 with lengths in metres
+    return RoadGraph(
+        node_ids=np.array([1, 2, 3], dtype=np.int64),
+        x=np.array([73.85, 73.86, 73.87]), y=np.array([18.52, 18.52, 18.53]),
+        indptr=np.array([0, 1, 3, 3], dtype=np.int64),
+        indices=np.array([1, 0, 2], dtype=np.int32),
+        lengths=np.array([100.0, 100.0, 250.0])
+    )
+
+def test_save_and_load_round_trip(tmp_path):
+    directory = str(tmp_path / "graph")
+    small_graph().save(directory)
+    small_graph().save(directory)  # replacing an existing cache
+    loaded = RoadGraph.load(directory)
+    assert loaded is not None
+    assert loaded.distance_matrix([1], [3])[0, 0] == 350.0
+    assert sorted(os.listdir(tmp_path)) == ["graph"]
+
+@pytest.mark.parametrize("mmap", [True, False])
+@pytest.mark.parametrize("filename", ["indices.npy", "meta.json", "spatial_index.pkl"])
+def test_load_truncated_cache(tmp_path, filename, mmap):
+    directory = str(tmp_path / "graph")
+    small_graph().save(directory)
+    path = os.path.join(directory, filename)
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+
+    loaded = RoadGraph.load(directory, mmap=mmap)
+    if filename == "spatial_index.pkl":
+        # The KD-tree is only a cache of the coordinates and is rebuilt
+        assert loaded is not None and loaded._tree is None
+    else:
+        assert loaded is None
+
+def test_load_missing_directory(tmp_path):
+    assert RoadGraph.load(str(tmp_path / "missing")) is None
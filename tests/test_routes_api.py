@@ -0,0 +1,22 @@
+def make_route(client, name: str, stops: list) -> dict:
+    response = client.post("/routes", json={"name": name, "stops": stops, "total_distance": 5.0,
+                                            "estimated_time": 10 * (len(stops) - 1)})
+    assert response.status_code == 200
+    return response.json()
+
+def test_route_keeps_one_shape_for_direct_and_transfer_answers(client, make_stop):
+    a, b, c = make_stop("A"), make_stop("B"), make_stop("C")
+    make_route(client, "A-B", [a["id"], b["id"]])
+    make_route(client, "B-C", [b["id"], c["id"]])
+
+    direct = client.post("/route", json={"from_stop": a["id"], "to_stop": b["id"]})
+    transfer = client.post("/route", json={"from_stop": a["id"], "to_stop": c["id"]})
+    assert direct.status_code == transfer.status_code == 200
+    direct, transfer = direct.json(), transfer.json()
+    assert direct.keys() == transfer.keys()
+
+    assert direct["route"]["stops"] == [a["id"], b["id"]]
+    assert direct["journey"] is None and direct["transfers"] == 0
+    assert transfer["route"] is None
+    assert transfer["transfers"] == 1
+    assert [leg["name"] for leg in transfer["journey"]["legs"]] == ["A-B", "B-C"]